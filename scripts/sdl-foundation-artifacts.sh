@@ -0,0 +1,45 @@
+#!/bin/bash
+
+# Lambda and Glue artifacts of the foundation stack, sourced by both the create and the update
+# script so a new module or script only has to be added here. Paths are relative to
+# scripts/create and scripts/update.
+
+SHARED_LAMBDA_SRC="../../sdl-common/lambda/src/*.py"
+LAMBDA_GLUE_CRAWLER_TRIGGER_SRC="../../sdl-etl-jobs/lambda/glue-crawler-trigger/src/lambda_function.py"
+LAMBDA_GLUE_JOB_TRIGGER_SRC="../../sdl-etl-jobs/lambda/glue-job-trigger/src/lambda_function.py"
+LAMBDA_MONITOR_EVENT_SRC="../../sdl-monitoring/lambda/monitor-event-subscriber/src/*.py ../../sdl-monitoring/lambda/monitor-event-subscriber/src/*.json"
+GLUE_JOB_SCRIPT_SRC="../../sdl-etl-jobs/glue/script/src/glue_job.py"
+GLUE_COMPACTION_SCRIPT_SRC="../../sdl-monitoring/glue/script/src/compaction_job.py"
+GLUE_ROLLUP_SCRIPT_SRC="../../sdl-monitoring/glue/script/src/rollup_job.py"
+
+LAMBDA_GLUE_CRAWLER_TRIGGER_ZIP="../../sdl-etl-jobs/lambda/glue-crawler-trigger/src/lambda_function.zip"
+LAMBDA_GLUE_JOB_TRIGGER_ZIP="../../sdl-etl-jobs/lambda/glue-job-trigger/src/lambda_function.zip"
+LAMBDA_MONITOR_EVENT_ZIP="../../sdl-monitoring/lambda/monitor-event-subscriber/src/lambda_function.zip"
+LAMBDA_MONITOR_LAYER_ZIP="../../sdl-monitoring/lambda/monitor-event-subscriber/src/layer/layer.zip"
+
+# Zip the Lambda functions; every Lambda zip also carries the shared helpers (EMF metrics).
+# Benchmark scripts next to the sources are not deployed
+build_artifacts() {
+    zip -j $LAMBDA_GLUE_CRAWLER_TRIGGER_ZIP $LAMBDA_GLUE_CRAWLER_TRIGGER_SRC $SHARED_LAMBDA_SRC
+    zip -j $LAMBDA_GLUE_JOB_TRIGGER_ZIP $LAMBDA_GLUE_JOB_TRIGGER_SRC $SHARED_LAMBDA_SRC
+    zip -j $LAMBDA_MONITOR_EVENT_ZIP $LAMBDA_MONITOR_EVENT_SRC $SHARED_LAMBDA_SRC -x "*benchmark_*"
+}
+
+# Upload the Lambda functions and Glue scripts to the given S3 bucket
+upload_artifacts() {
+    local bucket_name=$1
+    aws s3 cp $LAMBDA_GLUE_CRAWLER_TRIGGER_ZIP s3://$bucket_name/lambda/glue-crawler-trigger/src/lambda_function.zip
+    aws s3 cp $LAMBDA_GLUE_JOB_TRIGGER_ZIP s3://$bucket_name/lambda/glue-job-trigger/src/lambda_function.zip
+    aws s3 cp $LAMBDA_MONITOR_EVENT_ZIP s3://$bucket_name/lambda/monitor-event-subscriber/src/lambda_function.zip
+    aws s3 cp $LAMBDA_MONITOR_LAYER_ZIP s3://$bucket_name/layer/monitor-event-subscriber/src/layer.zip
+    aws s3 cp $GLUE_JOB_SCRIPT_SRC s3://$bucket_name/glue/script/src/glue_job.py
+    aws s3 cp $GLUE_COMPACTION_SCRIPT_SRC s3://$bucket_name/glue/script/src/compaction_job.py
+    aws s3 cp $GLUE_ROLLUP_SCRIPT_SRC s3://$bucket_name/glue/script/src/rollup_job.py
+}
+
+remove_artifacts() {
+    rm -f $LAMBDA_GLUE_CRAWLER_TRIGGER_ZIP
+    rm -f $LAMBDA_GLUE_JOB_TRIGGER_ZIP
+    rm -f $LAMBDA_MONITOR_EVENT_ZIP
+    # rm -f $LAMBDA_MONITOR_LAYER_ZIP
+}
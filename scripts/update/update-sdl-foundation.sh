@@ -6,20 +6,11 @@ TEMPLATE_FILE="../../sdl-foundation/template.yaml"
 PARAMETERS_FILE="../../sdl-foundation/parameters.json"
 CHANGE_SET_NAME="$STACK_NAME-change-set"
 
-LAMBDA_GLUE_CRAWLER_TRIGGER_SRC="../../sdl-etl-jobs/lambda/glue-crawler-trigger/src/lambda_function.py"
-LAMBDA_GLUE_JOB_TRIGGER_SRC="../../sdl-etl-jobs/lambda/glue-job-trigger/src/lambda_function.py"
-LAMBDA_MONITOR_EVENT_SRC="../../sdl-monitoring/lambda/monitor-event-subscriber/src/lambda_function.py"
-GLUE_JOB_SCRIPT_SRC="../../sdl-etl-jobs/glue/script/src/glue_job.py"
+# Lambda and Glue artifacts, shared with the create script
+source ../sdl-foundation-artifacts.sh
 
-LAMBDA_GLUE_CRAWLER_TRIGGER_ZIP="../../sdl-etl-jobs/lambda/glue-crawler-trigger/src/lambda_function.zip"
-LAMBDA_GLUE_JOB_TRIGGER_ZIP="../../sdl-etl-jobs/lambda/glue-job-trigger/src/lambda_function.zip"
-LAMBDA_MONITOR_EVENT_ZIP="../../sdl-monitoring/lambda/monitor-event-subscriber/src/lambda_function.zip"
-LAMBDA_MONITOR_LAYER_ZIP="../../sdl-monitoring/lambda/monitor-event-subscriber/src/layer/layer.zip"
-
-# Zip the Lambda function and Glue script
-zip -j $LAMBDA_GLUE_CRAWLER_TRIGGER_ZIP $LAMBDA_GLUE_CRAWLER_TRIGGER_SRC
-zip -j $LAMBDA_GLUE_JOB_TRIGGER_ZIP $LAMBDA_GLUE_JOB_TRIGGER_SRC
-zip -j $LAMBDA_MONITOR_EVENT_ZIP $LAMBDA_MONITOR_EVENT_SRC
+# Zip the Lambda functions
+build_artifacts
 
 # Get the S3 bucket name from the CloudFormation stack outputs
 BUCKET_NAME=$(aws cloudformation describe-stacks --stack-name $STACK_NAME --query "Stacks[0].Outputs[?OutputKey=='oLambdaGlueS3BucketName'].OutputValue" --output text)
@@ -36,18 +27,11 @@ echo "S3 bucket: $BUCKET_NAME"
 aws s3 rm s3://$BUCKET_NAME --recursive
 
 # Upload the Lambda function and Glue script to the S3 bucket
-aws s3 cp $LAMBDA_GLUE_CRAWLER_TRIGGER_ZIP s3://$BUCKET_NAME/lambda/glue-crawler-trigger/src/lambda_function.zip
-aws s3 cp $LAMBDA_GLUE_JOB_TRIGGER_ZIP s3://$BUCKET_NAME/lambda/glue-job-trigger/src/lambda_function.zip
-aws s3 cp $LAMBDA_MONITOR_EVENT_ZIP s3://$BUCKET_NAME/lambda/monitor-event-subscriber/src/lambda_function.zip
-aws s3 cp $LAMBDA_MONITOR_LAYER_ZIP s3://$BUCKET_NAME/layer/monitor-event-subscriber/src/layer.zip
-aws s3 cp $GLUE_JOB_SCRIPT_SRC s3://$BUCKET_NAME/glue/script/src/glue_job.py
+upload_artifacts $BUCKET_NAME
 
 echo "Lambda functions and Glue script uploaded to S3 bucket."
 
-rm -f $LAMBDA_GLUE_CRAWLER_TRIGGER_ZIP
-rm -f $LAMBDA_GLUE_JOB_TRIGGER_ZIP
-rm -f $LAMBDA_MONITOR_EVENT_ZIP
-# rm -f $LAMBDA_MONITOR_LAYER_ZIP
+remove_artifacts
 
 # Create a change set
 aws cloudformation create-change-set --stack-name $STACK_NAME --template-body file://$TEMPLATE_FILE --parameters file://$PARAMETERS_FILE --capabilities CAPABILITY_NAMED_IAM --change-set-name $CHANGE_SET_NAME
@@ -0,0 +1,112 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# CloudWatch Embedded Metric Format (EMF) instrumentation shared by the pipeline Lambdas.
+# Metrics are collected in memory during an invocation and written to stdout as EMF JSON
+# lines when the handler returns; CloudWatch Logs extracts them asynchronously, so recording
+# a metric never makes an API call. Every Lambda zip packages this module next to its
+# handler.
+#
+#   from metrics import metrics
+#
+#   @metrics.instrument
+#   def lambda_handler(event, context):
+#       with metrics.timer('S3PutLatency'):
+#           s3.put_object(...)
+#       metrics.add('RecordsProcessed', len(records))
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ServerlessDataLake')
+METRICS_SERVICE = os.environ.get('METRICS_SERVICE', os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local'))
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+# EMF accepts at most 100 metrics per document and 100 values per metric
+MAX_METRICS_PER_DOCUMENT = 100
+MAX_VALUES_PER_METRIC = 100
+
+
+class Metrics:
+
+    def __init__(self, namespace=METRICS_NAMESPACE, service=METRICS_SERVICE, enabled=METRICS_ENABLED):
+        self.namespace = namespace
+        self.service = service
+        self.enabled = enabled
+        self.cold_start = True
+        self.values = {}
+        self.units = {}
+        self.lock = threading.Lock()
+
+    # Adds to a counter that is emitted once per invocation
+    def add(self, name, value=1, unit='Count'):
+        with self.lock:
+            self.units[name] = unit
+            self.values[name] = [self.values.get(name, [0])[0] + value]
+
+    # Records one sample, e.g. a latency; every sample is kept for percentiles
+    def record(self, name, value, unit='Milliseconds'):
+        with self.lock:
+            self.units[name] = unit
+            self.values.setdefault(name, []).append(value)
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, round((time.perf_counter() - started) * 1000, 3))
+
+    def documents(self):
+        with self.lock:
+            values, units = self.values, self.units
+            self.values, self.units = {}, {}
+        documents = []
+        pending = {name: list(samples) for name, samples in values.items()}
+        while pending:
+            names = list(pending)[:MAX_METRICS_PER_DOCUMENT]
+            document = {
+                '_aws': {
+                    'Timestamp': int(time.time() * 1000),
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [['Service']],
+                        'Metrics': [{'Name': name, 'Unit': units[name]} for name in names]
+                    }]
+                },
+                'Service': self.service
+            }
+            for name in names:
+                samples = pending[name]
+                chunk, pending[name] = samples[:MAX_VALUES_PER_METRIC], samples[MAX_VALUES_PER_METRIC:]
+                document[name] = chunk[0] if len(chunk) == 1 else chunk
+                if not pending[name]:
+                    del pending[name]
+            documents.append(document)
+        return documents
+
+    def flush(self):
+        for document in self.documents():
+            if self.enabled:
+                print(json.dumps(document))
+
+    # Wraps a Lambda handler: flags cold starts, times the invocation and flushes on return
+    def instrument(self, handler):
+        @wraps(handler)
+        def wrapper(event, context):
+            if self.cold_start:
+                self.cold_start = False
+                self.add('ColdStart')
+            try:
+                with self.timer('HandlerLatency'):
+                    return handler(event, context)
+            except Exception:
+                self.add('HandlerErrors')
+                raise
+            finally:
+                self.flush()
+        return wrapper
+
+
+metrics = Metrics()
@@ -2,10 +2,12 @@ import os
 import json
 import boto3
 import logging
+from metrics import metrics
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+@metrics.instrument
 def lambda_handler(event, context):
     glue_client = boto3.client('glue')
 
@@ -25,13 +27,16 @@ def lambda_handler(event, context):
 
     try:
         # Check Crawler status
-        response = glue_client.get_crawler(Name=crawler_name)
+        with metrics.timer('GlueApiLatency'):
+            response = glue_client.get_crawler(Name=crawler_name)
         crawler_state = response['Crawler']['State']
         
         if crawler_state == 'READY':
             # Start Glue Crawler
-            glue_client.start_crawler(Name=crawler_name)
+            with metrics.timer('GlueApiLatency'):
+                glue_client.start_crawler(Name=crawler_name)
             logger.info(f"Started crawler: {crawler_name}")
+            metrics.add('CrawlsStarted')
             
             return {
                 'statusCode': 200,
@@ -39,6 +44,7 @@ def lambda_handler(event, context):
             }
         else:
             logger.warning(f"Crawler {crawler_name} is currently {crawler_state} and cannot be started.")
+            metrics.add('CrawlsSkipped')
             return {
                 'statusCode': 400,
                 'body': json.dumps(f"Crawler {crawler_name} is currently {crawler_state} and cannot be started.")
@@ -2,10 +2,12 @@ import os
 import json
 import boto3
 import logging
+from metrics import metrics
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+@metrics.instrument
 def lambda_handler(event, context):
     glue_client = boto3.client('glue')
 
@@ -25,8 +27,10 @@ def lambda_handler(event, context):
 
     try:
         # Start Glue Job
-        response = glue_client.start_job_run(JobName=job_name)
+        with metrics.timer('GlueApiLatency'):
+            response = glue_client.start_job_run(JobName=job_name)
         logger.info(f"Started Glue job: {job_name}, response: {response}")
+        metrics.add('JobRunsStarted')
         
         return {
             'statusCode': 200,
@@ -0,0 +1,142 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from monitor_queries import DuckDBEngine, MonitorQueries, NAMED_QUERIES
+
+# Compares the DuckDB engine over the two layouts of the monitoring bucket: the subscriber's
+# small gzip NDJSON objects (dt=/hour=/entity_type=) and the compaction job's daily Parquet
+# files (dt=/entity_type=). Generates synthetic logs for the given number of months, then
+# times every named query over the whole range on a fresh engine.
+#
+# Usage:
+#   python benchmark_layouts.py [--months 3] [--jobs 50] [--runs-per-day 24] [--dir /tmp/monitoring-bench]
+
+DATABASE = 'monitor-db'
+TABLE = 'monitor-table'
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark JSON vs Parquet layouts of the monitoring logs')
+    parser.add_argument('--months', type=int, default=3, help='Months of logs to generate')
+    parser.add_argument('--jobs', type=int, default=50, help='Number of Glue jobs')
+    parser.add_argument('--crawlers', type=int, default=10, help='Number of Glue crawlers')
+    parser.add_argument('--runs-per-day', type=int, default=24, help='Runs per job and crawls per crawler per day')
+    parser.add_argument('--objects-per-hour', type=int, default=4, help='Log objects the subscriber writes per hour and entity type')
+    parser.add_argument('--dir', help='Where to generate the logs, default a temporary directory')
+    return parser.parse_args(argv)
+
+
+def job_events(day, job, run, rng):
+    started = day + timedelta(hours=run % 24, minutes=rng.randrange(60))
+    execution_time = rng.randrange(60, 1800)
+    state = 'FAILED' if rng.random() < 0.05 else 'SUCCEEDED'
+    finished = started + timedelta(seconds=execution_time)
+    event = {
+        'state': state, 'job_name': f"job-{job}", 'crawler_name': 'N/A',
+        'timestamp': finished.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'message': f"Glue Job 'job-{job}' has reached state: {state} at {finished.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        'job_run_id': f"jr_{job}_{day:%Y%m%d}_{run}", 'execution_time_seconds': execution_time,
+        'dpu_seconds': execution_time * 2.0, 'worker_type': 'G.1X', 'number_of_workers': 2, 'attempt': 0,
+        'error_message': 'An error occurred while calling o99.save' if state == 'FAILED' else None,
+        'error_lines': ['ERROR ... py4j.protocol.Py4JJavaError'] if state == 'FAILED' else None
+    }
+    return [(finished, event)]
+
+
+def crawler_events(day, crawler, run, rng):
+    started = day + timedelta(hours=run % 24, minutes=rng.randrange(50))
+    finished = started + timedelta(seconds=rng.randrange(30, 600))
+    events = []
+    for state, moment in (('Started', started), ('Succeeded', finished)):
+        events.append((moment, {
+            'state': state, 'job_name': 'N/A', 'crawler_name': f"crawler-{crawler}",
+            'timestamp': moment.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'message': f"Glue Crawler 'crawler-{crawler}' has reached state: {state}"
+        }))
+    return events
+
+
+def generate(args, root, start, days):
+    import duckdb
+    rng = random.Random(42)
+    table_root = os.path.join(root, DATABASE, TABLE)
+    for day_index in range(days):
+        day = start + timedelta(days=day_index)
+        partitions = {}
+        for job in range(args.jobs):
+            for run in range(args.runs_per_day):
+                for moment, event in job_events(day, job, run, rng):
+                    partitions.setdefault((moment, 'job'), []).append(event)
+        for crawler in range(args.crawlers):
+            for run in range(args.runs_per_day):
+                for moment, event in crawler_events(day, crawler, run, rng):
+                    partitions.setdefault((moment, 'crawler'), []).append(event)
+        # Spread each hour's events over a few objects, like the subscriber's per-invocation batches
+        objects = {}
+        for (moment, entity_type), events in partitions.items():
+            key = (moment.strftime('%Y-%m-%d'), f"{moment.hour:02d}", entity_type, moment.minute % args.objects_per_hour)
+            objects.setdefault(key, []).extend(events)
+        for (dt, hour, entity_type, batch), events in objects.items():
+            directory = os.path.join(table_root, f"dt={dt}", f"hour={hour}", f"entity_type={entity_type}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"batch-{day_index}-{batch}.json.gz")
+            body = '\n'.join(json.dumps(event) for event in events) + '\n'
+            with open(path, 'wb') as log_file:
+                log_file.write(gzip.compress(body.encode('utf-8')))
+
+    json_objects = sum(len(files) for _, _, files in os.walk(table_root))
+    json_bytes = sum(os.path.getsize(os.path.join(path, name)) for path, _, files in os.walk(table_root) for name in files)
+
+    # The compaction job's layout: one Snappy Parquet file per day and entity type, typed columns
+    compacted_root = os.path.join(root, DATABASE, f"{TABLE}-compacted")
+    duckdb.connect().execute(f"""
+        COPY (
+            SELECT * EXCLUDE ("timestamp", hour), CAST("timestamp" AS TIMESTAMP) AS "timestamp", CAST(hour AS INTEGER) AS hour
+            FROM read_json('{table_root}/dt=*/hour=*/entity_type=*/*.json.gz', format = 'newline_delimited',
+                           hive_partitioning = true, union_by_name = true,
+                           hive_types = {{'dt': 'VARCHAR', 'hour': 'VARCHAR', 'entity_type': 'VARCHAR'}})
+        ) TO '{compacted_root}' (FORMAT parquet, COMPRESSION snappy, PARTITION_BY (dt, entity_type), OVERWRITE_OR_IGNORE)
+    """)
+    parquet_bytes = sum(os.path.getsize(os.path.join(path, name)) for path, _, files in os.walk(compacted_root) for name in files)
+    parquet_objects = sum(len(files) for _, _, files in os.walk(compacted_root))
+    return {'json': (json_objects, json_bytes), 'parquet': (parquet_objects, parquet_bytes)}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = args.dir or tempfile.mkdtemp(prefix='monitoring-bench-')
+    days = args.months * 30
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=days)
+
+    generate_started = time.perf_counter()
+    sizes = generate(args, root, start, days)
+    print(f"Generated {days} days of logs under {root} in {time.perf_counter() - generate_started:.1f}s")
+    for layout, (objects, size) in sizes.items():
+        print(f"  {layout:8} {objects:7} objects {size / 1024 / 1024:9.1f} MiB")
+
+    params = {'failures_by_job': {}, 'last_runs': {'limit': 20}, 'crawl_durations': {}}
+    print(f"{'query':18} {'json (s)':>9} {'parquet (s)':>12} {'rows':>7}")
+    for name in NAMED_QUERIES:
+        timings = []
+        rows = None
+        for layout in ('json', 'parquet'):
+            queries = MonitorQueries(DuckDBEngine(root, DATABASE, TABLE, layout), TABLE)
+            started = time.perf_counter()
+            result = queries.run(name, start, end, **params[name])
+            timings.append(time.perf_counter() - started)
+            if rows is not None and len(result['rows']) != rows:
+                print(f"Row count mismatch for {name}: {rows} vs {len(result['rows'])}")
+            rows = len(result['rows'])
+        print(f"{name:18} {timings[0]:9.2f} {timings[1]:12.2f} {rows:7}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,500 @@
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import boto3
+from datetime import datetime, timedelta
+
+# Named, parameterized queries over the monitoring table (rMonitorTable).
+#
+# Usage:
+#   python monitor_queries.py failures_by_job --database my-org-devops-dev-monitor-db \
+#       --table my-org-devops-dev-monitor-table --start 2024-07-01 --end 2024-07-08
+#   python monitor_queries.py last_runs --job my-job --limit 20 ...
+#   python monitor_queries.py crawl_durations --local-root ./monitoring-bucket ...
+#
+# Every query is limited to the partitions (dt, hour, entity_type) of the requested time range,
+# so Athena's partition projection reads only those prefixes, and to the rows of the range
+# itself, since the partitions are whole hours. Athena reuses recent results of
+# an identical query, and finished results are also kept in an on-disk cache keyed by the
+# normalized SQL and its parameters; ranges that are still open expire from it after a few
+# minutes. With --local-root the same SQL runs on DuckDB (or SQLite) over a local copy of the
+# bucket or a local S3 stand-in, without Athena.
+
+CACHE_DIR = os.environ.get('MONITOR_QUERY_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'monitor-queries'))
+OPEN_RANGE_TTL_SECONDS = int(os.environ.get('MONITOR_QUERY_OPEN_RANGE_TTL_SECONDS', '300'))
+RESULT_REUSE_MINUTES = int(os.environ.get('MONITOR_QUERY_RESULT_REUSE_MINUTES', '60'))
+# How far before the range crawl_durations looks for the start of a crawl that finished in it
+CRAWL_LOOKBACK_HOURS = int(os.environ.get('MONITOR_QUERY_CRAWL_LOOKBACK_HOURS', '24'))
+FAILURE_STATES = ('FAILED', 'TIMEOUT', 'ERROR')
+TERMINAL_STATES = ('SUCCEEDED', 'FAILED', 'TIMEOUT', 'STOPPED', 'ERROR')
+# rMonitorTable's schema, as laid out by the subscriber (JSON) and the compaction job (Parquet)
+COLUMN_TYPES = {
+    'state': 'VARCHAR', 'job_name': 'VARCHAR', 'crawler_name': 'VARCHAR', 'timestamp': 'VARCHAR',
+    'message': 'VARCHAR', 'job_run_id': 'VARCHAR', 'execution_time_seconds': 'INTEGER', 'dpu_seconds': 'DOUBLE',
+    'worker_type': 'VARCHAR', 'number_of_workers': 'INTEGER', 'attempt': 'INTEGER', 'error_message': 'VARCHAR',
+    'error_lines': 'VARCHAR[]'
+}
+TABLE_COLUMNS = [
+    'state', 'job_name', 'crawler_name', 'timestamp', 'message', 'job_run_id', 'execution_time_seconds',
+    'dpu_seconds', 'worker_type', 'number_of_workers', 'attempt', 'error_message', 'error_lines',
+    'dt', 'hour', 'entity_type'
+]
+
+
+# SQL that differs between Athena (Trino) and the local SQLite stand-in
+class AthenaDialect:
+    name = 'athena'
+
+    def seconds_between(self, start, end):
+        return f"date_diff('second', {self.timestamp(start)}, {self.timestamp(end)})"
+
+    def timestamp(self, column):
+        # The subscriber logs EventBridge's ISO 8601 timestamps, or Python's str(datetime) as a fallback
+        return f"coalesce(try(from_iso8601_timestamp({column})), try(cast({column} AS timestamp)))"
+
+    def timestamp_literal(self, value):
+        return f"TIMESTAMP '{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+
+
+class DuckDBDialect:
+    name = 'duckdb'
+
+    def seconds_between(self, start, end):
+        return f"date_diff('second', {self.timestamp(start)}, {self.timestamp(end)})"
+
+    def timestamp(self, column):
+        return f"TRY_CAST({column} AS TIMESTAMP)"
+
+    def timestamp_literal(self, value):
+        return f"TIMESTAMP '{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+
+
+class SQLiteDialect:
+    name = 'sqlite'
+
+    def seconds_between(self, start, end):
+        return f"CAST(ROUND((julianday({end}) - julianday({start})) * 86400) AS INTEGER)"
+
+    def timestamp(self, column):
+        return f"datetime({column})"
+
+    def timestamp_literal(self, value):
+        return f"'{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+
+
+def hour_range(start, end):
+    start = start.replace(minute=0, second=0, microsecond=0)
+    if end.minute or end.second or end.microsecond:
+        end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    return start, end
+
+
+# Predicates pinning a query to the partitions of [start, end), widened to whole hours
+def partition_predicates(start, end, entity_type=None):
+    start, end = hour_range(start, end)
+    last = end - timedelta(hours=1)
+    first_day, last_day = start.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')
+    if first_day == last_day:
+        predicates = [f"dt = '{first_day}'"]
+        if start.hour != 0 or last.hour != 23:
+            predicates.append(f"hour BETWEEN '{start.hour:02d}' AND '{last.hour:02d}'")
+    else:
+        predicates = [f"dt BETWEEN '{first_day}' AND '{last_day}'"]
+        if start.hour != 0:
+            predicates.append(f"(dt > '{first_day}' OR hour >= '{start.hour:02d}')")
+        if last.hour != 23:
+            predicates.append(f"(dt < '{last_day}' OR hour <= '{last.hour:02d}')")
+    if entity_type:
+        predicates.append(f"entity_type = '{entity_type}'")
+    return ' AND '.join(predicates)
+
+
+# Row-level bound of [start, end); partition predicates alone let in the rest of the edge hours
+def time_range_predicate(dialect, start, end):
+    timestamp = dialect.timestamp('"timestamp"')
+    return f"{timestamp} >= {dialect.timestamp_literal(start)} AND {timestamp} < {dialect.timestamp_literal(end)}"
+
+
+def in_list(values):
+    return ', '.join(f"'{value}'" for value in values)
+
+
+def failures_by_job(table, dialect, start, end, job=None):
+    params = []
+    job_filter = ''
+    if job:
+        job_filter = 'AND job_name = ?'
+        params.append(job)
+    sql = f"""
+        SELECT job_name, state, COUNT(*) AS failures, MAX("timestamp") AS last_failure
+        FROM "{table}"
+        WHERE {partition_predicates(start, end, 'job')}
+          AND {time_range_predicate(dialect, start, end)}
+          AND state IN ({in_list(FAILURE_STATES)}) {job_filter}
+        GROUP BY job_name, state
+        ORDER BY failures DESC, job_name
+    """
+    return sql, params
+
+
+def last_runs(table, dialect, start, end, job=None, limit=10):
+    params = []
+    job_filter = ''
+    if job:
+        job_filter = 'AND job_name = ?'
+        params.append(job)
+    sql = f"""
+        SELECT job_name, job_run_id, state, "timestamp", execution_time_seconds, dpu_seconds, error_message
+        FROM "{table}"
+        WHERE {partition_predicates(start, end, 'job')}
+          AND {time_range_predicate(dialect, start, end)}
+          AND state IN ({in_list(TERMINAL_STATES)}) {job_filter}
+        ORDER BY {dialect.timestamp('"timestamp"')} DESC
+        LIMIT {int(limit)}
+    """
+    return sql, params
+
+
+def crawl_durations(table, dialect, start, end, crawler=None):
+    params = []
+    crawler_filter = ''
+    if crawler:
+        crawler_filter = 'AND crawler_name = ?'
+        params.append(crawler)
+    # Crawls are kept by their finish. Their start events are read from CRAWL_LOOKBACK_HOURS before
+    # the range on, so a crawl that finished in the range but started up to that long before it
+    # still has its start; one that ran longer is left out
+    sql = f"""
+        WITH events AS (
+            SELECT crawler_name, state, "timestamp",
+                   LAG(state) OVER (PARTITION BY crawler_name ORDER BY {dialect.timestamp('"timestamp"')}) AS previous_state,
+                   LAG("timestamp") OVER (PARTITION BY crawler_name ORDER BY {dialect.timestamp('"timestamp"')}) AS started_at
+            FROM "{table}"
+            WHERE {partition_predicates(start - timedelta(hours=CRAWL_LOOKBACK_HOURS), end, 'crawler')} {crawler_filter}
+        )
+        SELECT crawler_name, started_at, "timestamp" AS finished_at, state,
+               {dialect.seconds_between('started_at', '"timestamp"')} AS duration_seconds
+        FROM events
+        WHERE previous_state = 'Started' AND state IN ('Succeeded', 'Failed')
+          AND {time_range_predicate(dialect, start, end)}
+        ORDER BY finished_at DESC
+    """
+    return sql, params
+
+
+NAMED_QUERIES = {
+    'failures_by_job': failures_by_job,
+    'last_runs': last_runs,
+    'crawl_durations': crawl_durations
+}
+
+
+def normalize_sql(sql):
+    # Collapse whitespace outside string literals, so formatting never splits the cache
+    parts = re.split(r"('(?:[^']|'')*')", sql.strip())
+    return ''.join(part if index % 2 else re.sub(r'\s+', ' ', part) for index, part in enumerate(parts)).strip()
+
+
+# On-disk result cache: one JSON file per (engine, database, normalized SQL, parameters)
+class ResultCache:
+
+    def __init__(self, directory=CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if entry['expires_at'] is not None and entry['expires_at'] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['result']
+
+    def put(self, key, result, ttl_seconds=None):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        entry = {'key': key, 'expires_at': time.time() + ttl_seconds if ttl_seconds is not None else None, 'result': result}
+        # Write then rename, so a reader never sees a partial file
+        with open(f"{path}.{os.getpid()}.tmp", 'w') as cache_file:
+            json.dump(entry, cache_file)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+
+def sql_literal(value):
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+ATHENA_NUMERIC_TYPES = {'tinyint': int, 'smallint': int, 'integer': int, 'bigint': int, 'double': float, 'float': float, 'real': float}
+
+
+class AthenaEngine:
+
+    dialect = AthenaDialect()
+
+    def __init__(self, database, workgroup='primary', output_location=None, reuse_minutes=RESULT_REUSE_MINUTES, client=None):
+        self.database = database
+        self.workgroup = workgroup
+        self.output_location = output_location
+        self.reuse_minutes = reuse_minutes
+        self.client = client or boto3.client('athena')
+
+    def cache_key(self):
+        return f"athena:{self.workgroup}:{self.database}"
+
+    def execute(self, sql, params):
+        request = {
+            'QueryString': sql,
+            'QueryExecutionContext': {'Database': self.database},
+            'WorkGroup': self.workgroup
+        }
+        if params:
+            # Athena substitutes execution parameters as SQL literals
+            request['ExecutionParameters'] = [sql_literal(param) for param in params]
+        if self.output_location:
+            request['ResultConfiguration'] = {'OutputLocation': self.output_location}
+        if self.reuse_minutes:
+            request['ResultReuseConfiguration'] = {
+                'ResultReuseByAgeConfiguration': {'Enabled': True, 'MaxAgeInMinutes': self.reuse_minutes}
+            }
+        query_id = self.client.start_query_execution(**request)['QueryExecutionId']
+
+        delay = 0.2
+        while True:
+            execution = self.client.get_query_execution(QueryExecutionId=query_id)['QueryExecution']
+            state = execution['Status']['State']
+            if state == 'SUCCEEDED':
+                break
+            if state in ('FAILED', 'CANCELLED'):
+                raise RuntimeError(f"Query {query_id} {state}: {execution['Status'].get('StateChangeReason', '')}")
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
+        statistics = execution.get('Statistics', {})
+        print(f"Query {query_id}: scanned {statistics.get('DataScannedInBytes', 0)} bytes, "
+              f"reused: {statistics.get('ResultReuseInformation', {}).get('ReusedPreviousResult', False)}", file=sys.stderr)
+
+        columns, rows = None, []
+        for page in self.client.get_paginator('get_query_results').paginate(QueryExecutionId=query_id):
+            if columns is None:
+                column_info = page['ResultSet']['ResultSetMetadata']['ColumnInfo']
+                columns = [column['Name'] for column in column_info]
+                converters = [ATHENA_NUMERIC_TYPES.get(column['Type'], str) for column in column_info]
+                page_rows = page['ResultSet']['Rows'][1:]
+            else:
+                page_rows = page['ResultSet']['Rows']
+            for row in page_rows:
+                rows.append([
+                    converter(cell['VarCharValue']) if 'VarCharValue' in cell else None
+                    for converter, cell in zip(converters, row['Data'])
+                ])
+        return {'columns': columns or [], 'rows': rows}
+
+
+# Stand-in for offline checks: loads a local copy of the monitoring bucket into SQLite
+class LocalEngine:
+
+    dialect = SQLiteDialect()
+
+    def __init__(self, root, database, table):
+        self.root = root
+        self.database = database
+        self.table = table
+        self.connection = None
+
+    def cache_key(self):
+        return f"local:{os.path.abspath(self.root)}:{self.database}"
+
+    def _load(self):
+        # Columns missing from older log lines read as NULL, like in Athena
+        connection = sqlite3.connect(':memory:')
+        connection.execute(f'CREATE TABLE "{self.table}" ({", ".join(TABLE_COLUMNS)})')
+        insert = f'INSERT INTO "{self.table}" VALUES ({", ".join("?" * len(TABLE_COLUMNS))})'
+        table_root = os.path.join(self.root, self.database, self.table)
+        for path in sorted(glob.glob(os.path.join(table_root, 'dt=*', 'hour=*', 'entity_type=*', '*.json.gz'))):
+            partition = dict(part.split('=', 1) for part in os.path.relpath(path, table_root).split(os.sep)[:-1])
+            with gzip.open(path, 'rt', encoding='utf-8') as log_file:
+                records = [dict(json.loads(line), **partition) for line in log_file if line.strip()]
+            connection.executemany(insert, [
+                [json.dumps(record.get(column)) if isinstance(record.get(column), list) else record.get(column)
+                 for column in TABLE_COLUMNS]
+                for record in records
+            ])
+        return connection
+
+    def execute(self, sql, params):
+        if self.connection is None:
+            self.connection = self._load()
+        cursor = self.connection.execute(sql, params)
+        return {'columns': [column[0] for column in cursor.description], 'rows': [list(row) for row in cursor.fetchall()]}
+
+
+# Local engine over the bucket layout itself, a local directory or an S3 stand-in: 'json' reads
+# the subscriber's dt=/hour=/entity_type= NDJSON objects, 'parquet' the compaction job's
+# dt=/entity_type= files. Both are exposed as rMonitorTable, so the named queries run
+# unchanged and DuckDB prunes partitions from their predicates. Requires the duckdb package.
+class DuckDBEngine:
+
+    dialect = DuckDBDialect()
+
+    def __init__(self, root, database, table, layout='json', compacted_table=None, endpoint_url=None):
+        import duckdb
+        self.root = root.rstrip('/')
+        self.database = database
+        self.table = table
+        self.layout = layout
+        self.connection = duckdb.connect()
+        if self.root.startswith('s3://'):
+            self._configure_s3(endpoint_url)
+        if layout == 'json':
+            source = f"""read_json('{self.root}/{database}/{table}/dt=*/hour=*/entity_type=*/*.json.gz',
+                format = 'newline_delimited', hive_partitioning = true,
+                hive_types = {{'dt': 'VARCHAR', 'hour': 'VARCHAR', 'entity_type': 'VARCHAR'}},
+                columns = {{{', '.join(f"'{name}': '{data_type}'" for name, data_type in COLUMN_TYPES.items())}}})"""
+            self.connection.execute(f'CREATE VIEW "{table}" AS SELECT * FROM {source}')
+        elif layout == 'parquet':
+            compacted_table = compacted_table or f"{table}-compacted"
+            source = f"""read_parquet('{self.root}/{database}/{compacted_table}/dt=*/entity_type=*/*.parquet',
+                hive_partitioning = true, union_by_name = true,
+                hive_types = {{'dt': 'VARCHAR', 'entity_type': 'VARCHAR'}})"""
+            # Compacted files type timestamp and hour; present them as the JSON table does, with
+            # columns that older files lack as NULL
+            present = {row[0] for row in self.connection.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()}
+            columns = []
+            for name, data_type in COLUMN_TYPES.items():
+                if name == 'timestamp':
+                    columns.append('''strftime("timestamp", '%Y-%m-%dT%H:%M:%SZ') AS "timestamp"''')
+                elif name in present:
+                    columns.append(f'CAST("{name}" AS {data_type}) AS "{name}"')
+                else:
+                    columns.append(f'CAST(NULL AS {data_type}) AS "{name}"')
+            columns += ["dt", "lpad(CAST(hour AS VARCHAR), 2, '0') AS hour", "entity_type"]
+            self.connection.execute(f'CREATE VIEW "{table}" AS SELECT {", ".join(columns)} FROM {source}')
+        else:
+            raise ValueError(f"Unknown layout {layout}, expected json or parquet")
+
+    def _configure_s3(self, endpoint_url):
+        credentials = boto3.Session().get_credentials().get_frozen_credentials()
+        options = {
+            'KEY_ID': credentials.access_key,
+            'SECRET': credentials.secret_key,
+            'REGION': boto3.Session().region_name or 'us-east-1'
+        }
+        if credentials.token:
+            options['SESSION_TOKEN'] = credentials.token
+        if endpoint_url:
+            scheme, host = endpoint_url.split('://', 1)
+            options.update(ENDPOINT=host.rstrip('/'), URL_STYLE='path', USE_SSL=str(scheme == 'https').lower())
+        self.connection.execute('INSTALL httpfs')
+        self.connection.execute('LOAD httpfs')
+        self.connection.execute(
+            'CREATE SECRET monitoring (TYPE s3, ' + ', '.join(f"{key} '{value}'" for key, value in options.items()) + ')'
+        )
+
+    def cache_key(self):
+        return f"duckdb:{self.layout}:{self.root}:{self.database}"
+
+    def execute(self, sql, params):
+        cursor = self.connection.execute(sql, params)
+        return {'columns': [column[0] for column in cursor.description], 'rows': [list(row) for row in cursor.fetchall()]}
+
+
+class MonitorQueries:
+
+    def __init__(self, engine, table, cache=None):
+        self.engine = engine
+        self.table = table
+        self.cache = cache
+
+    def run(self, name, start, end, **params):
+        sql, bind = NAMED_QUERIES[name](self.table, self.engine.dialect, start, end, **params)
+        return self.run_sql(sql, bind, open_range=hour_range(start, end)[1] > datetime.utcnow())
+
+    def run_sql(self, sql, params=(), open_range=True):
+        key = json.dumps([self.engine.cache_key(), normalize_sql(sql), list(params)])
+        if self.cache is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+        result = self.engine.execute(sql, list(params))
+        if self.cache is not None:
+            # Results of closed ranges never change; open ones are only kept briefly
+            self.cache.put(key, result, OPEN_RANGE_TTL_SECONDS if open_range else None)
+        return result
+
+
+def parse_time(value):
+    for time_format in ('%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"Invalid time {value}, expected YYYY-MM-DD or YYYY-MM-DDTHH:MM (UTC)")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Run a named query over the monitoring table')
+    parser.add_argument('query', choices=sorted(NAMED_QUERIES), help='Named query to run')
+    parser.add_argument('--database', default=os.environ.get('MONITOR_DATABASE'), help='Monitoring database')
+    parser.add_argument('--table', default=os.environ.get('MONITOR_TABLE'), help='Monitoring table')
+    parser.add_argument('--start', type=parse_time, help='Range start (UTC), default 7 days ago')
+    parser.add_argument('--end', type=parse_time, help='Range end (UTC, exclusive), default now')
+    parser.add_argument('--job', help='Only this Glue job (failures_by_job, last_runs)')
+    parser.add_argument('--crawler', help='Only this Glue crawler (crawl_durations)')
+    parser.add_argument('--limit', type=int, default=10, help='Number of runs (last_runs)')
+    parser.add_argument('--workgroup', default='primary', help='Athena workgroup')
+    parser.add_argument('--output-location', help='S3 location for results if the workgroup has none')
+    parser.add_argument('--local-root', help='Run locally over a copy of the monitoring bucket (a directory or s3://bucket) instead of Athena')
+    parser.add_argument('--engine', choices=['duckdb', 'sqlite'], default='duckdb', help='Local engine for --local-root')
+    parser.add_argument('--layout', choices=['json', 'parquet'], default='json',
+                        help='Read the raw JSON logs or the compacted Parquet files (duckdb only)')
+    parser.add_argument('--compacted-table', help='Compacted table name, default <table>-compacted')
+    parser.add_argument('--endpoint-url', help='S3 endpoint of a local S3 stand-in (duckdb with s3:// roots)')
+    parser.add_argument('--no-cache', action='store_true', help='Skip the on-disk result cache')
+    args = parser.parse_args(argv)
+    if not args.database or not args.table:
+        parser.error('--database and --table are required (or set MONITOR_DATABASE / MONITOR_TABLE)')
+    args.end = args.end or datetime.utcnow()
+    args.start = args.start or args.end - timedelta(days=7)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.local_root and args.engine == 'duckdb':
+        engine = DuckDBEngine(args.local_root, args.database, args.table, args.layout, args.compacted_table, args.endpoint_url)
+    elif args.local_root:
+        engine = LocalEngine(args.local_root, args.database, args.table)
+    else:
+        engine = AthenaEngine(args.database, args.workgroup, args.output_location)
+    queries = MonitorQueries(engine, args.table, None if args.no_cache else ResultCache())
+    params = {
+        'failures_by_job': {'job': args.job},
+        'last_runs': {'job': args.job, 'limit': args.limit},
+        'crawl_durations': {'crawler': args.crawler}
+    }[args.query]
+    result = queries.run(args.query, args.start, args.end, **params)
+    print('\t'.join(result['columns']))
+    for row in result['rows']:
+        print('\t'.join('' if value is None else str(value) for value in row))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from monitor_queries import DuckDBEngine, LocalEngine, MonitorQueries
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+DATABASE = 'monitor-db'
+TABLE = 'monitor-table'
+START = datetime(2024, 7, 1, 10, 15)
+END = datetime(2024, 7, 1, 11, 30)
+
+
+def job_event(job_name, state, timestamp, job_run_id):
+    return {'state': state, 'job_name': job_name, 'crawler_name': 'N/A', 'timestamp': timestamp,
+            'message': f"Glue Job '{job_name}' has reached state: {state}", 'job_run_id': job_run_id,
+            'execution_time_seconds': 60, 'dpu_seconds': 120.0}
+
+
+def crawler_event(crawler_name, state, timestamp):
+    return {'state': state, 'job_name': 'N/A', 'crawler_name': crawler_name, 'timestamp': timestamp,
+            'message': f"Glue Crawler '{crawler_name}' has reached state: {state}"}
+
+
+# Events around the range [10:15, 11:30), in the partitions the subscriber writes them to
+EVENTS = [
+    job_event('job-a', 'FAILED', '2024-07-01T09:30:00Z', 'jr_1'),
+    job_event('job-a', 'FAILED', '2024-07-01T10:20:00Z', 'jr_2'),
+    job_event('job-b', 'SUCCEEDED', '2024-07-01T10:40:00Z', 'jr_3'),
+    job_event('job-b', 'TIMEOUT', '2024-07-01T11:50:00Z', 'jr_4'),
+    # Started in an earlier hour of the same day
+    crawler_event('crawler-a', 'Started', '2024-07-01T09:50:00Z'),
+    crawler_event('crawler-a', 'Succeeded', '2024-07-01T10:20:00Z'),
+    # Started the day before
+    crawler_event('crawler-b', 'Started', '2024-06-30T23:30:00Z'),
+    crawler_event('crawler-b', 'Failed', '2024-07-01T10:45:00Z'),
+    # Started longer than the look-back before the range
+    crawler_event('crawler-c', 'Started', '2024-06-30T08:00:00Z'),
+    crawler_event('crawler-c', 'Succeeded', '2024-07-01T10:50:00Z'),
+    # Finished after the range
+    crawler_event('crawler-a', 'Started', '2024-07-01T11:20:00Z'),
+    crawler_event('crawler-a', 'Succeeded', '2024-07-01T11:40:00Z')
+]
+
+
+def write_bucket(root):
+    for index, event in enumerate(EVENTS):
+        entity_type = 'job' if event['job_name'] != 'N/A' else 'crawler'
+        partition = os.path.join(root, DATABASE, TABLE, f"dt={event['timestamp'][:10]}",
+                                 f"hour={event['timestamp'][11:13]}", f"entity_type={entity_type}")
+        os.makedirs(partition, exist_ok=True)
+        with gzip.open(os.path.join(partition, f"{index}.json.gz"), 'wt', encoding='utf-8') as log_file:
+            log_file.write(json.dumps(event) + '\n')
+
+
+# Lays the same events out as the compaction job does: typed Parquet under dt=/entity_type=
+def write_compacted(root):
+    connection = duckdb.connect()
+    connection.execute(f"""
+        COPY (
+            SELECT * EXCLUDE ("timestamp", hour), CAST("timestamp" AS TIMESTAMP) AS "timestamp",
+                   CAST(hour AS INTEGER) AS hour
+            FROM read_json('{root}/{DATABASE}/{TABLE}/dt=*/hour=*/entity_type=*/*.json.gz',
+                           format = 'newline_delimited', hive_partitioning = true)
+        ) TO '{root}/{DATABASE}/{TABLE}-compacted' (FORMAT parquet, PARTITION_BY (dt, entity_type))
+    """)
+    connection.close()
+
+
+class NamedQueriesTest:
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        write_bucket(self.root)
+        self.queries = MonitorQueries(self.engine(), TABLE)
+
+    def run_query(self, name, **params):
+        return self.queries.run(name, START, END, **params)['rows']
+
+    def test_failures_by_job_counts_only_rows_in_the_range(self):
+        self.assertEqual(self.run_query('failures_by_job'), [['job-a', 'FAILED', 1, '2024-07-01T10:20:00Z']])
+
+    def test_last_runs_are_bounded_to_the_range(self):
+        rows = self.run_query('last_runs')
+        self.assertEqual([(row[1], row[2]) for row in rows], [('jr_3', 'SUCCEEDED'), ('jr_2', 'FAILED')])
+
+    def test_crawls_started_before_the_range_keep_their_start(self):
+        rows = self.run_query('crawl_durations')
+        self.assertEqual([(row[0], row[1], row[3], row[4]) for row in rows], [
+            ('crawler-b', '2024-06-30T23:30:00Z', 'Failed', 40500),
+            ('crawler-a', '2024-07-01T09:50:00Z', 'Succeeded', 1800)
+        ])
+
+    def test_crawl_durations_of_one_crawler(self):
+        rows = self.run_query('crawl_durations', crawler='crawler-a')
+        self.assertEqual([(row[0], row[4]) for row in rows], [('crawler-a', 1800)])
+
+
+class LocalEngineTest(NamedQueriesTest, unittest.TestCase):
+
+    def engine(self):
+        return LocalEngine(self.root, DATABASE, TABLE)
+
+
+@unittest.skipUnless(duckdb, 'duckdb is not installed')
+class DuckDBEngineTest(NamedQueriesTest, unittest.TestCase):
+
+    def engine(self):
+        return DuckDBEngine(self.root, DATABASE, TABLE)
+
+
+@unittest.skipUnless(duckdb, 'duckdb is not installed')
+class DuckDBParquetEngineTest(NamedQueriesTest, unittest.TestCase):
+
+    def engine(self):
+        write_compacted(self.root)
+        return DuckDBEngine(self.root, DATABASE, TABLE, layout='parquet')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+import sys
+import json
+import math
+import boto3
+from datetime import datetime, timedelta
+
+from awsglue.utils import getResolvedOptions
+from pyspark.context import SparkContext
+from pyspark.sql import functions as F
+from pyspark.sql.types import ArrayType
+from awsglue.context import GlueContext
+from awsglue.job import Job
+
+# Initialize the Glue context
+args = getResolvedOptions(sys.argv, [
+    'JOB_NAME', 'JOB_RUN_ID', 'MONITOR_BUCKET', 'MONITOR_DATABASE', 'MONITOR_TABLE',
+    'COMPACTED_TABLE', 'PARTITION_DATE', 'LOOKBACK_DAYS', 'MAX_DAYS_PER_RUN', 'DRY_RUN', 'DELETE_SOURCE',
+    'TARGET_FILE_SIZE_MB'
+])
+sc = SparkContext()
+glueContext = GlueContext(sc)
+spark = glueContext.spark_session
+job = Job(glueContext)
+job.init(args['JOB_NAME'], args)
+
+s3 = boto3.client('s3')
+glue = boto3.client('glue')
+
+monitor_bucket = args['MONITOR_BUCKET']
+monitor_db = args['MONITOR_DATABASE']
+monitor_table = args['MONITOR_TABLE']
+compacted_table = args['COMPACTED_TABLE']
+dry_run = args['DRY_RUN'].lower() == 'true'
+delete_source = args['DELETE_SOURCE'].lower() == 'true'
+target_file_bytes = int(args['TARGET_FILE_SIZE_MB']) * 1024 * 1024
+
+# Only closed partitions are compacted, never today. PARTITION_DATE=pending compacts every closed
+# day of the last LOOKBACK_DAYS with source objects written since its last compaction, so a day
+# missed by a failed run, or receiving late events, is compacted by the next run; 'yesterday' or a
+# date (yyyy-MM-dd) compacts that day only
+today = datetime.utcnow().strftime('%Y-%m-%d')
+partition_date_arg = args['PARTITION_DATE']
+if partition_date_arg == 'yesterday':
+    partition_date_arg = (datetime.utcnow() - timedelta(days=1)).strftime('%Y-%m-%d')
+if partition_date_arg != 'pending' and partition_date_arg >= today:
+    raise ValueError(f"Partition dt={partition_date_arg} is still open and cannot be compacted")
+first_day = (datetime.utcnow() - timedelta(days=int(args['LOOKBACK_DAYS']))).strftime('%Y-%m-%d')
+max_days = int(args['MAX_DAYS_PER_RUN'])
+
+monitor_prefix = f"{monitor_db}/{monitor_table}/"
+compacted_prefix = f"{monitor_db}/{compacted_table}/"
+staging_prefix = f"{compacted_prefix}_staging/{args['JOB_RUN_ID']}/"
+progress_key = f"{compacted_prefix}_progress.json"
+
+print(f"Monitoring bucket: {monitor_bucket}")
+print(f"Source prefix: {monitor_prefix}")
+print(f"Compacted prefix: {compacted_prefix}")
+print(f"Dry run: {dry_run}")
+
+
+def list_objects(prefix):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=monitor_bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            yield obj
+
+
+def delete_objects(keys):
+    keys = list(keys)
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(
+            Bucket=monitor_bucket,
+            Delete={'Objects': [{'Key': key} for key in keys[i:i + 1000]], 'Quiet': True}
+        )
+
+
+def register_partition(partition_date, entity_type):
+    location = f"s3://{monitor_bucket}/{compacted_prefix}dt={partition_date}/entity_type={entity_type}/"
+    table = glue.get_table(DatabaseName=monitor_db, Name=compacted_table)['Table']
+    storage_descriptor = dict(table['StorageDescriptor'], Location=location)
+    partition_input = {'Values': [partition_date, entity_type], 'StorageDescriptor': storage_descriptor}
+    try:
+        glue.create_partition(DatabaseName=monitor_db, TableName=compacted_table, PartitionInput=partition_input)
+    except glue.exceptions.AlreadyExistsException:
+        glue.update_partition(
+            DatabaseName=monitor_db,
+            TableName=compacted_table,
+            PartitionValueList=[partition_date, entity_type],
+            PartitionInput=partition_input
+        )
+
+
+# Progress is kept per day: the latest modification of the source objects compacted. Days compacted
+# before it was kept fall back to the modification of their compacted output
+def read_progress():
+    try:
+        body = json.loads(s3.get_object(Bucket=monitor_bucket, Key=progress_key)['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return {}
+    return body['compacted']
+
+
+def save_progress(progress):
+    s3.put_object(
+        Bucket=monitor_bucket,
+        Key=progress_key,
+        Body=json.dumps({'compacted': progress, 'job_run_id': args['JOB_RUN_ID']}).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+# Maps every day from first_day on to the latest modification of the objects under the prefix
+def latest_by_day(prefix, suffix):
+    days = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=monitor_bucket, Prefix=prefix, StartAfter=f"{prefix}dt={first_day}"):
+        for obj in page.get('Contents', []):
+            part = obj['Key'][len(prefix):].split('/')[0]
+            if not part.startswith('dt=') or not obj['Key'].endswith(suffix):
+                continue
+            day = part[len('dt='):]
+            days[day] = max(days.get(day, ''), obj['LastModified'].isoformat())
+    return days
+
+
+def typed_logs(logs_df):
+    def typed_column(name, data_type):
+        column = F.col(name) if name in logs_df.columns else F.lit(None)
+        return column.cast(data_type).alias(name)
+
+    # JSON inference reads a column that is null in every row (e.g. error_lines on a day without a
+    # failed run) as string, which cannot be cast to an array
+    def typed_array_column(name, data_type):
+        if name in logs_df.columns and isinstance(logs_df.schema[name].dataType, ArrayType):
+            return F.col(name).cast(data_type).alias(name)
+        return F.lit(None).cast(data_type).alias(name)
+
+    return logs_df.select(
+        F.col('state').cast('string').alias('state'),
+        F.col('job_name').cast('string').alias('job_name'),
+        F.col('crawler_name').cast('string').alias('crawler_name'),
+        F.col('timestamp').cast('timestamp').alias('timestamp'),
+        F.col('message').cast('string').alias('message'),
+        typed_column('job_run_id', 'string'),
+        typed_column('execution_time_seconds', 'int'),
+        typed_column('dpu_seconds', 'double'),
+        typed_column('worker_type', 'string'),
+        typed_column('number_of_workers', 'int'),
+        typed_column('attempt', 'int'),
+        typed_column('error_message', 'string'),
+        typed_array_column('error_lines', 'array<string>'),
+        F.col('hour').cast('int').alias('hour'),
+        F.col('entity_type')
+    )
+
+
+# Compacts one closed day; returns whether its output was published
+def compact_partition(partition_date):
+    source_prefix = f"{monitor_prefix}dt={partition_date}/"
+    output_day_prefix = f"{compacted_prefix}dt={partition_date}/"
+
+    # Measure the small JSON objects of the closed partition
+    source_objects = [obj for obj in list_objects(source_prefix) if obj['Key'].endswith('.json.gz')]
+    bytes_before = sum(obj['Size'] for obj in source_objects)
+    print(f"Found {len(source_objects)} source objects ({bytes_before} bytes) under {source_prefix}")
+
+    if not source_objects:
+        # Nothing left to merge, e.g. a re-run after DELETE_SOURCE: keep the existing output
+        print(f"No source objects under {source_prefix}, nothing to compact")
+        return False
+
+    # Read the partition and cast the columns to their real types; logs written before a column
+    # existed read it as null
+    typed_df = typed_logs(spark.read.json(f"s3://{monitor_bucket}/{source_prefix}"))
+
+    # With DELETE_SOURCE the sources of an earlier compaction are gone, so late events of the day are
+    # merged into its existing output instead of replacing it
+    if delete_source and any(obj['Key'].endswith('.parquet') for obj in list_objects(output_day_prefix)):
+        compacted_df = spark.read.option('mergeSchema', 'true').parquet(f"s3://{monitor_bucket}/{output_day_prefix}")
+        for field in typed_df.schema.fields:
+            if field.name not in compacted_df.columns:
+                compacted_df = compacted_df.withColumn(field.name, F.lit(None).cast(field.dataType))
+        typed_df = typed_df.unionByName(compacted_df.select(*typed_df.columns))
+        print(f"Merging the existing output of dt={partition_date}")
+    typed_df = typed_df.dropDuplicates()
+
+    # Write a few Snappy-compressed Parquet files per entity type to a staging prefix
+    num_files = max(1, math.ceil(bytes_before / target_file_bytes))
+    typed_df.repartition(num_files, 'entity_type').write \
+        .mode('overwrite') \
+        .option('compression', 'snappy') \
+        .partitionBy('entity_type') \
+        .parquet(f"s3://{monitor_bucket}/{staging_prefix}")
+    print("Successfully wrote staged Parquet files")
+
+    staged_objects = [obj for obj in list_objects(staging_prefix) if obj['Key'].endswith('.parquet')]
+    bytes_after = sum(obj['Size'] for obj in staged_objects)
+    print(f"Compaction of dt={partition_date}: {len(source_objects)} objects / {bytes_before} bytes -> "
+          f"{len(staged_objects)} objects / {bytes_after} bytes")
+
+    if dry_run:
+        delete_objects(obj['Key'] for obj in list_objects(staging_prefix))
+        print("Dry run: staged files removed, catalog and source left untouched")
+        return False
+
+    # Replace the output partitions with the staged files, so re-runs overwrite instead of appending
+    entity_types = sorted({obj['Key'][len(staging_prefix):].split('/')[0].split('=')[1] for obj in staged_objects})
+    for entity_type in entity_types:
+        output_prefix = f"{output_day_prefix}entity_type={entity_type}/"
+        delete_objects(obj['Key'] for obj in list_objects(output_prefix))
+        for obj in staged_objects:
+            if obj['Key'].startswith(f"{staging_prefix}entity_type={entity_type}/"):
+                s3.copy_object(
+                    Bucket=monitor_bucket,
+                    CopySource={'Bucket': monitor_bucket, 'Key': obj['Key']},
+                    Key=output_prefix + obj['Key'].rsplit('/', 1)[1]
+                )
+        register_partition(partition_date, entity_type)
+        print(f"Successfully published dt={partition_date}/entity_type={entity_type}")
+
+    delete_objects(obj['Key'] for obj in list_objects(staging_prefix))
+
+    if delete_source:
+        delete_objects(obj['Key'] for obj in source_objects)
+        print(f"Removed {len(source_objects)} compacted source objects")
+    return True
+
+
+source_days = {day: stamp for day, stamp in latest_by_day(monitor_prefix, '.json.gz').items() if day < today}
+progress = {day: stamp for day, stamp in read_progress().items() if day >= first_day}
+if partition_date_arg == 'pending':
+    compacted = dict(latest_by_day(compacted_prefix, '.parquet'), **progress)
+    pending_days = [day for day in sorted(source_days) if compacted.get(day, '') < source_days[day]]
+else:
+    pending_days = [partition_date_arg]
+print(f"Days to compact: {pending_days[:max_days]}, left for later runs: {len(pending_days[max_days:])}")
+
+for partition_date in pending_days[:max_days]:
+    if compact_partition(partition_date) and partition_date in source_days:
+        progress[partition_date] = source_days[partition_date]
+        # Saved after every day, so a failed run keeps the days it finished
+        save_progress(progress)
+
+job.commit()
+print("Job committed successfully")
@@ -0,0 +1,151 @@
+import sys
+import json
+import boto3
+from datetime import datetime
+
+from awsglue.utils import getResolvedOptions
+from pyspark.context import SparkContext
+from pyspark.sql import functions as F
+from awsglue.context import GlueContext
+from awsglue.job import Job
+
+# Initialize the Glue context
+args = getResolvedOptions(sys.argv, [
+    'JOB_NAME', 'JOB_RUN_ID', 'MONITOR_BUCKET', 'MONITOR_DATABASE', 'COMPACTED_TABLE', 'ROLLUP_TABLE',
+    'START_DATE', 'MAX_DAYS_PER_RUN'
+])
+sc = SparkContext()
+glueContext = GlueContext(sc)
+spark = glueContext.spark_session
+# Overwrite only the day partitions being written, never the whole table
+spark.conf.set('spark.sql.sources.partitionOverwriteMode', 'dynamic')
+job = Job(glueContext)
+job.init(args['JOB_NAME'], args)
+
+s3 = boto3.client('s3')
+
+monitor_bucket = args['MONITOR_BUCKET']
+monitor_db = args['MONITOR_DATABASE']
+compacted_prefix = f"{monitor_db}/{args['COMPACTED_TABLE']}/"
+rollup_prefix = f"{monitor_db}/{args['ROLLUP_TABLE']}/"
+progress_key = f"{rollup_prefix}_watermark.json"
+max_days = int(args['MAX_DAYS_PER_RUN'])
+
+TERMINAL_STATES = ['SUCCEEDED', 'FAILED', 'TIMEOUT', 'STOPPED', 'ERROR']
+
+print(f"Monitoring bucket: {monitor_bucket}")
+print(f"Compacted prefix: {compacted_prefix}")
+print(f"Rollup prefix: {rollup_prefix}")
+
+
+# Progress is kept per day: the latest modification of each compacted day partition that was
+# rolled up. A day compacted late, or compacted again, is newer than its recorded stamp (or has
+# none) and is rolled up on the next run, even if later days were rolled up before it
+def read_progress(days):
+    try:
+        body = json.loads(s3.get_object(Bucket=monitor_bucket, Key=progress_key)['Body'].read())
+    except s3.exceptions.NoSuchKey:
+        return {}
+    if 'rolled_up' in body:
+        return body['rolled_up']
+    # Progress written as a single high-water mark: the days up to it were rolled up as they are now
+    return {day: stamp for day, (stamp, _) in days.items() if day <= body['last_dt']}
+
+
+def save_progress(progress):
+    # Written only after the rollup, so a failed run is simply repeated
+    s3.put_object(
+        Bucket=monitor_bucket,
+        Key=progress_key,
+        Body=json.dumps({'rolled_up': progress, 'job_run_id': args['JOB_RUN_ID']}).encode('utf-8'),
+        ContentType='application/json'
+    )
+    print(f"Progress saved for {len(progress)} days")
+
+
+# Maps every compacted day to (latest modification, whether it has job runs)
+def compacted_days():
+    days = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=monitor_bucket, Prefix=compacted_prefix):
+        for obj in page.get('Contents', []):
+            parts = obj['Key'][len(compacted_prefix):].split('/')
+            if not parts[0].startswith('dt=') or len(parts) < 3:
+                continue
+            day = parts[0][len('dt='):]
+            stamp, has_jobs = days.get(day, ('', False))
+            days[day] = (max(stamp, obj['LastModified'].isoformat()), has_jobs or parts[1] == 'entity_type=job')
+    return days
+
+
+# START_DATE=watermark rolls up the days that are new or changed since their last rollup; an
+# explicit date (yyyy-MM-dd) rebuilds every day from that one on
+today = datetime.utcnow().strftime('%Y-%m-%d')
+days = {day: value for day, value in compacted_days().items() if day < today}
+progress = read_progress(days)
+if args['START_DATE'] == 'watermark':
+    pending_days = [day for day in sorted(days) if progress.get(day, '') < days[day][0]]
+else:
+    pending_days = [day for day in sorted(days) if day >= args['START_DATE']]
+pending_days = pending_days[:max_days]
+print(f"Rolled up days: {len(progress)}, days to roll up: {pending_days}")
+
+
+def mark_rolled_up():
+    save_progress(dict(progress, **{day: days[day][0] for day in pending_days}))
+
+
+job_days = [day for day in pending_days if days[day][1]]
+if not job_days:
+    print("No new or changed job runs, nothing to roll up")
+    if pending_days:
+        mark_rolled_up()
+    job.commit()
+    sys.exit(0)
+
+# Read only the job partitions of the pending days; days compacted before the run metrics existed
+# read them as null
+runs_df = spark.read \
+    .option('basePath', f"s3://{monitor_bucket}/{compacted_prefix}") \
+    .option('mergeSchema', 'true') \
+    .parquet(*[f"s3://{monitor_bucket}/{compacted_prefix}dt={day}/entity_type=job/" for day in job_days])
+for name, data_type in [('job_run_id', 'string'), ('execution_time_seconds', 'int'), ('dpu_seconds', 'double')]:
+    if name not in runs_df.columns:
+        runs_df = runs_df.withColumn(name, F.lit(None).cast(data_type))
+
+# One row per finished run and state; redelivered events of the same run count once. Events
+# logged without a run id fall back to their timestamp
+finished_df = runs_df.filter(F.col('state').isin(TERMINAL_STATES)) \
+    .withColumn('run_key', F.coalesce(F.col('job_run_id'), F.col('timestamp').cast('string'))) \
+    .dropDuplicates(['dt', 'job_name', 'run_key', 'state'])
+
+
+def count_state(*states):
+    return F.sum(F.when(F.col('state').isin(list(states)), 1).otherwise(0)).cast('int')
+
+
+rollup_df = finished_df.groupBy('dt', 'job_name').agg(
+    F.count(F.lit(1)).cast('int').alias('runs'),
+    count_state('SUCCEEDED').alias('succeeded'),
+    count_state('FAILED', 'ERROR').alias('failed'),
+    count_state('TIMEOUT').alias('timed_out'),
+    count_state('STOPPED').alias('stopped'),
+    F.expr('percentile_approx(execution_time_seconds, 0.5)').cast('int').alias('p50_execution_seconds'),
+    F.expr('percentile_approx(execution_time_seconds, 0.95)').cast('int').alias('p95_execution_seconds'),
+    F.max('execution_time_seconds').cast('int').alias('max_execution_seconds'),
+    F.sum('dpu_seconds').cast('double').alias('dpu_seconds'),
+    F.max('timestamp').alias('last_run_at')
+)
+
+# A day is a handful of rows: write one small Parquet file per day partition
+rollup_df.repartition('dt').write \
+    .mode('overwrite') \
+    .option('compression', 'snappy') \
+    .partitionBy('dt') \
+    .parquet(f"s3://{monitor_bucket}/{rollup_prefix}")
+print(f"Successfully rolled up {len(job_days)} days with job runs, dt={job_days[0]}..{job_days[-1]}")
+
+mark_rolled_up()
+
+job.commit()
+print("Job committed successfully")
@@ -0,0 +1,100 @@
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 4, 'sdl-common', 'lambda', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+import lambda_function
+
+# Measures peak memory and time of decoding CloudWatch Logs subscription payloads of growing
+# size, eagerly (b64decode, gzip.decompress, json.loads, then a list of details) and with the
+# forwarder's streaming decoder, end to end through the handler with a PutEvents client that
+# accepts everything. The base64 input itself is allocated before tracing starts. Streaming
+# trades CPU time for memory, so the handler only streams payloads of STREAM_DECODE_MIN_BYTES and
+# more; here it always streams.
+#
+# Usage:
+#   python benchmark_decode.py [--sizes-mb 1,3,6]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark eager vs streaming decode of CloudWatch Logs payloads')
+    parser.add_argument('--sizes-mb', default='1,3,6', help='Comma-separated base64 payload sizes in MB')
+    return parser.parse_args(argv)
+
+
+class AcceptingClient:
+    def put_events(self, Entries):
+        return {'FailedEntryCount': 0, 'Entries': [{'EventId': '0'} for _ in Entries]}
+
+
+def make_payload(size_bytes):
+    rng = random.Random(42)
+    words = ['INFO', 'WARN', 'ERROR', 'stage', 'task', 'executor', 'partition', 'shuffle', 'py4j', 'Exception']
+    log_events = []
+    encoded = ''
+    batch = 2000
+    while len(encoded) < size_bytes:
+        for _ in range(batch):
+            index = len(log_events)
+            message = ' '.join(rng.choice(words) + str(rng.randrange(10000)) for _ in range(rng.randrange(5, 60)))
+            log_events.append({'id': str(index), 'timestamp': 1700000000000 + index, 'message': message})
+        data = {
+            'messageType': 'DATA_MESSAGE', 'owner': '123456789012', 'logGroup': '/aws-glue/jobs/output',
+            'logStream': 'jr_0123456789', 'subscriptionFilters': ['glue-logs'], 'logEvents': log_events
+        }
+        raw = json.dumps(data).encode('utf-8')
+        encoded = base64.b64encode(gzip.compress(raw)).decode('ascii')
+    return encoded, len(raw), len(log_events)
+
+
+def decode_eager(data):
+    payload = json.loads(gzip.decompress(base64.b64decode(data)))
+    details = [
+        {'owner': payload['owner'], 'logGroup': payload['logGroup'], 'logStream': payload['logStream'],
+         'id': log_event['id'], 'timestamp': log_event['timestamp'], 'message': log_event['message']}
+        for log_event in payload['logEvents']
+    ]
+    return sum(1 for _ in lambda_function.pack_entries((0, detail) for detail in details))
+
+
+# Forces the streaming decoder whatever the payload size
+def decode_streaming(data):
+    lambda_function.STREAM_DECODE_MIN_BYTES = 0
+    return lambda_function.lambda_handler({'awslogs': {'data': data}}, None)['records'][0]['events']
+
+
+def measure(function, data):
+    tracemalloc.start()
+    started = time.perf_counter()
+    function(data)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    lambda_function.client = AcceptingClient()
+    print(f"{'base64 MB':>9} {'json MB':>8} {'events':>7} {'eager peak MB':>14} {'eager s':>8} "
+          f"{'stream peak MB':>15} {'stream s':>9}")
+    for size in [float(size) for size in args.sizes_mb.split(',')]:
+        data, raw_bytes, events = make_payload(int(size * 1024 * 1024))
+        eager_peak, eager_time = measure(decode_eager, data)
+        stream_peak, stream_time = measure(decode_streaming, data)
+        print(f"{len(data) / 1024 / 1024:9.1f} {raw_bytes / 1024 / 1024:8.1f} {events:7} {eager_peak / 1024 / 1024:14.1f} "
+              f"{eager_time:8.2f} {stream_peak / 1024 / 1024:15.1f} {stream_time:9.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
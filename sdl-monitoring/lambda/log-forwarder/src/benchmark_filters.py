@@ -0,0 +1,112 @@
+import argparse
+import fnmatch
+import random
+import re
+import sys
+import time
+from log_filters import LogFilter, line_level
+
+# Per-line cost of the compiled log filter against a straightforward evaluation of the same
+# rules (fnmatch and re.search per rule and line, nothing cached), over synthetic Glue log
+# lines from a few log groups and job streams.
+#
+# Usage:
+#   python benchmark_filters.py [--lines 200000] [--rules 12]
+
+LOG_GROUPS = ['/aws-glue/jobs/output', '/aws-glue/jobs/error', '/aws-glue/jobs/logs-v2', '/aws-glue/crawlers']
+LEVEL_WEIGHTS = [('INFO', 70), ('DEBUG', 15), ('WARN', 8), ('ERROR', 5), ('TRACE', 2)]
+BASE_RULES = [
+    {'name': 'debug-noise', 'action': 'drop', 'levels': ['DEBUG', 'TRACE']},
+    {'name': 'errors', 'action': 'forward', 'levels': ['ERROR', 'FATAL']},
+    {'name': 'stack-traces', 'action': 'forward', 'contains': ['Exception', 'Traceback']},
+    {'name': 'billing-progress', 'action': 'drop', 'jobs': ['glue-etl-billing-*'], 'pattern': r'Processed \d+ rows'},
+    {'name': 'crawler-info', 'action': 'drop', 'log_groups': ['/aws-glue/crawlers'], 'levels': ['INFO']},
+    {'name': 'spark-info', 'action': 'sample', 'rate': 0.01, 'log_groups': ['/aws-glue/jobs/*'], 'levels': ['INFO']},
+]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark per-line log filter cost')
+    parser.add_argument('--lines', type=int, default=200000, help='Log lines to filter')
+    parser.add_argument('--rules', type=int, default=12, help='Rules in the set, padded with per-job rules')
+    return parser.parse_args(argv)
+
+
+def make_rules(count):
+    rules = list(BASE_RULES)
+    for index in range(len(rules), count):
+        rules.insert(0, {'name': f"job-{index}", 'action': 'drop', 'jobs': [f"glue-etl-team{index}-*"],
+                         'contains': ['heartbeat']})
+    return rules
+
+
+def make_lines(count):
+    rng = random.Random(42)
+    levels = [level for level, weight in LEVEL_WEIGHTS for _ in range(weight)]
+    jobs = [f"glue-etl-{team}-{index}" for team in ('billing', 'sales', 'ops', 'team7') for index in range(5)]
+    lines = []
+    for index in range(count):
+        level = rng.choice(levels)
+        text = rng.choice([
+            f"Processed {rng.randrange(10 ** 6)} rows", 'Starting task in stage 3.0', 'heartbeat received',
+            'py4j.protocol.Py4JJavaError: An Exception occurred', 'Block broadcast_5 stored as values in memory'
+        ])
+        message = f"24/01/01 12:{index % 60:02d}:00 {level} Executor: {text}"
+        stream = f"{rng.choice(jobs)}-{rng.choice(['driver', '1', '2', '3'])}"
+        lines.append((message, rng.choice(LOG_GROUPS), stream, str(index)))
+    return lines
+
+
+# The same first-match semantics without compilation or caching
+def evaluate_naive(rules, message, log_group, job):
+    level = line_level(message)
+    for rule in rules:
+        if 'log_groups' in rule and not any(fnmatch.fnmatch(log_group, pattern) for pattern in rule['log_groups']):
+            continue
+        if 'jobs' in rule and not any(fnmatch.fnmatch(job, pattern) for pattern in rule['jobs']):
+            continue
+        if 'levels' in rule and level not in rule['levels']:
+            continue
+        if 'contains' in rule or 'pattern' in rule:
+            if not (any(text in message for text in rule.get('contains', []))
+                    or ('pattern' in rule and re.search(rule['pattern'], message))):
+                continue
+        return rule['action'] != 'drop'
+    return True
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rules = make_rules(args.rules)
+    lines = make_lines(args.lines)
+
+    started = time.perf_counter()
+    log_filter = LogFilter(rules)
+    compile_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for message, log_group, job, event_id in lines:
+        log_filter.evaluate(message, log_group, job, event_id)
+    compiled_time = time.perf_counter() - started
+    counts = log_filter.take_counts()
+
+    empty_filter = LogFilter([])
+    started = time.perf_counter()
+    for message, log_group, job, event_id in lines:
+        empty_filter.evaluate(message, log_group, job, event_id)
+    empty_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for message, log_group, job, _ in lines:
+        evaluate_naive(rules, message, log_group, job)
+    naive_time = time.perf_counter() - started
+
+    print(f"{args.lines} lines, {len(rules)} rules, compiled in {compile_time * 1000:.2f} ms")
+    for name, elapsed in (('no rules', empty_time), ('compiled', compiled_time), ('naive', naive_time)):
+        print(f"  {name:10} {elapsed / args.lines * 1e9:8.0f} ns/line {args.lines / elapsed:12.0f} lines/s")
+    print(f"  forwarded {counts['forwarded']}, dropped {counts['dropped']}, sampled out {counts['sampled_out']}")
+    print(f"  by rule: {counts['by_rule']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 4, 'sdl-common', 'lambda', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+import boto3
+from botocore.config import Config
+import lambda_function
+
+# Compares forwarding one entry per PutEvents call with the size-aware packer, sent one batch
+# after another and on the worker pool, against a local EventBridge stand-in: an HTTP server
+# answering PutEvents after a fixed round-trip latency, rejecting requests above the
+# 10 entries / 256 KB limits and throttling a share of the entries, like the real API.
+#
+# Usage:
+#   python benchmark_put_events.py [--records 500] [--latency-ms 20] [--max-detail-bytes 40000] [--workers 4] [--throttle 0.1]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark per-record vs batched PutEvents')
+    parser.add_argument('--records', type=int, default=500, help='Records per invocation')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Simulated PutEvents round trip')
+    parser.add_argument('--max-detail-bytes', type=int, default=40000, help='Largest generated record')
+    parser.add_argument('--workers', type=int, default=lambda_function.PUT_EVENTS_WORKERS, help='PutEvents worker threads')
+    parser.add_argument('--throttle', type=float, default=0.0, help='Share of entries the stand-in rejects')
+    return parser.parse_args(argv)
+
+
+class EventBridgeStandIn(BaseHTTPRequestHandler):
+    latency = 0.0
+    throttle = 0.0
+    requests = 0
+    accepted = 0
+    rng = random.Random(7)
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        entries = body['Entries']
+        size = sum(len(entry['Source'].encode('utf-8')) + len(entry['DetailType'].encode('utf-8'))
+                   + len(entry['Detail'].encode('utf-8')) for entry in entries)
+        time.sleep(self.latency)
+        if len(entries) > lambda_function.MAX_ENTRIES_PER_REQUEST or size > lambda_function.MAX_REQUEST_BYTES:
+            self.respond(400, {'__type': 'ValidationException', 'message': f"{len(entries)} entries, {size} bytes"})
+            return
+        with self.lock:
+            results = [
+                {'ErrorCode': 'ThrottlingException', 'ErrorMessage': 'Rate exceeded'}
+                if self.rng.random() < self.throttle else {'EventId': str(uuid.uuid4())}
+                for _ in entries
+            ]
+            EventBridgeStandIn.requests += 1
+            EventBridgeStandIn.accepted += sum(1 for result in results if 'EventId' in result)
+        failed = sum(1 for result in results if 'ErrorCode' in result)
+        self.respond(200, {'FailedEntryCount': failed, 'Entries': results})
+
+    def respond(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_records(count, max_detail_bytes):
+    rng = random.Random(42)
+    records = []
+    for index in range(count):
+        lines = rng.randrange(1, max(2, max_detail_bytes // 100))
+        records.append({
+            'logGroup': '/aws-glue/jobs/output',
+            'logStream': f"jr_{index:06d}",
+            'message': '\n'.join(f"{index} INFO line {line} " + 'x' * 70 for line in range(lines))
+        })
+    return records
+
+
+# The original forwarder: one call per record, rejected entries are lost
+def forward_per_record(records):
+    for record in records:
+        lambda_function.client.put_events(Entries=[lambda_function.build_entry(record)[0]])
+
+
+def forward_batched(workers):
+    def forward(records):
+        lambda_function.PUT_EVENTS_WORKERS = workers
+        response = lambda_function.lambda_handler({'records': records}, None)
+        assert sum(1 for outcome in response['records'] if outcome['status'] == 'Forwarded') == EventBridgeStandIn.accepted
+    return forward
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    EventBridgeStandIn.latency = args.latency_ms / 1000
+    EventBridgeStandIn.throttle = args.throttle
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EventBridgeStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    lambda_function.client = boto3.client(
+        'events', endpoint_url=f"http://127.0.0.1:{server.server_port}", config=Config(max_pool_connections=max(10, args.workers)))
+
+    records = make_records(args.records, args.max_detail_bytes)
+    total_bytes = sum(lambda_function.build_entry(record)[1] for record in records)
+    print(f"{args.records} records, {total_bytes / 1024:.0f} KiB, {args.latency_ms:.0f} ms per PutEvents call, "
+          f"{args.throttle:.0%} of entries throttled")
+    print(f"{'mode':20} {'requests':>9} {'delivered':>10} {'seconds':>8} {'records/s':>10}")
+    modes = [('per-record', forward_per_record), ('batched, 1 worker', forward_batched(1)),
+             (f"batched, {args.workers} workers", forward_batched(args.workers))]
+    for mode, forward in modes:
+        EventBridgeStandIn.requests = EventBridgeStandIn.accepted = 0
+        started = time.perf_counter()
+        forward(records)
+        elapsed = time.perf_counter() - started
+        print(f"{mode:20} {EventBridgeStandIn.requests:9} {EventBridgeStandIn.accepted:10} {elapsed:8.2f} "
+              f"{len(records) / elapsed:10.0f}")
+
+    started = time.perf_counter()
+    batches = sum(1 for _ in lambda_function.pack_entries(enumerate(records)))
+    print(f"Packing alone: {batches} requests in {(time.perf_counter() - started) * 1000:.1f} ms")
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,418 @@
+import base64
+import gzip
+import io
 import json
+import os
+import random
+import re
+import time
+import zlib
+from collections import deque
 import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+from log_filters import LogFilter, load_filter_rules
+from metrics import metrics
 
-client = boto3.client('events')
+PUT_EVENTS_WORKERS = int(os.environ.get('PUT_EVENTS_WORKERS', '4'))
+PUT_EVENTS_MAX_ATTEMPTS = int(os.environ.get('PUT_EVENTS_MAX_ATTEMPTS', '5'))
+PUT_EVENTS_BACKOFF_BASE = float(os.environ.get('PUT_EVENTS_BACKOFF_BASE', '0.1'))
+PUT_EVENTS_BACKOFF_CAP = float(os.environ.get('PUT_EVENTS_BACKOFF_CAP', '5'))
+# Retries stop this long before the Lambda timeout so the handler can still report outcomes
+DEADLINE_MARGIN_SECONDS = float(os.environ.get('DEADLINE_MARGIN_SECONDS', '5'))
+# Decompressed characters read from a CloudWatch Logs payload at a time
+DECODE_CHUNK_SIZE = int(os.environ.get('DECODE_CHUNK_SIZE', '65536'))
+# Payloads (base64 characters) from this size on are stream-decoded, which bounds memory but takes
+# about twice the CPU time of decoding in one go; smaller ones, the usual case, are decoded eagerly
+STREAM_DECODE_MIN_BYTES = int(os.environ.get('STREAM_DECODE_MIN_BYTES', str(1024 * 1024)))
+# Lambda's 6 MB synchronous response limit, less room for the JSON around each record
+FIREHOSE_RESPONSE_LIMIT_BYTES = int(os.environ.get('FIREHOSE_RESPONSE_LIMIT_BYTES', str(6 * 1024 * 1024 - 64 * 1024)))
+FIREHOSE_RECORD_OVERHEAD_BYTES = 64
+LOG_FILTER_RULES_FILE = os.environ.get(
+    'LOG_FILTER_RULES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'log_filter_rules.json')
+)
 
-def lambda_handler(event, context):
-    for record in event['records']:
-        response = client.put_events(
-            Entries=[
-                {
-                    'Source': 'aws.logs',
-                    'DetailType': 'Glue Job/Crawler Log',
-                    'Detail': json.dumps(record),
-                    'EventBusName': 'default'
-                }
-            ]
-        )
+# Enough pooled connections for every worker to keep its own
+client = boto3.client('events', config=Config(max_pool_connections=max(10, PUT_EVENTS_WORKERS)))
+
+
+def build_log_filter():
+    if not os.path.exists(LOG_FILTER_RULES_FILE):
+        return LogFilter([])
+    rules, default_action = load_filter_rules(LOG_FILTER_RULES_FILE)
+    return LogFilter(rules, default_action)
+
+
+# Compiled once per container; the filter's rule cache carries across warm invocations
+log_filter = build_log_filter()
+
+SOURCE = 'aws.logs'
+DETAIL_TYPE = 'Glue Job/Crawler Log'
+EVENT_BUS_NAME = 'default'
+
+# PutEvents limits: 10 entries and 256 KB per request, where an entry's size is the UTF-8
+# length of its Source, DetailType and Detail
+MAX_ENTRIES_PER_REQUEST = 10
+MAX_REQUEST_BYTES = 256 * 1024
+ENTRY_OVERHEAD_BYTES = len(SOURCE.encode('utf-8')) + len(DETAIL_TYPE.encode('utf-8'))
+
+# Entry error codes worth another attempt; anything else fails the same way every time
+RETRYABLE_ERROR_CODES = {'ThrottlingException', 'InternalFailure', 'InternalException', 'ServiceUnavailable'}
+
+# Base64 of the gzip magic bytes: CloudWatch Logs subscription data, directly or through Firehose
+GZIP_BASE64_PREFIX = 'H4sI'
+# What a corrupt payload can raise: bad base64 or JSON (ValueError), a bad gzip header
+# (OSError), a truncated stream (EOFError) or a corrupt deflate body (zlib.error)
+DECODE_ERRORS = (ValueError, OSError, EOFError, zlib.error)
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+# File object decoding a base64 string a few KB at a time, so the compressed payload is never
+# held twice
+class Base64Reader(io.RawIOBase):
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data[self.position:self.position + len(buffer) // 3 * 4]
+        self.position += len(chunk)
+        decoded = base64.b64decode(chunk)
+        buffer[:len(decoded)] = decoded
+        return len(decoded)
+
+
+# Minimal pull parser over a text stream: decodes one JSON value at a time with raw_decode,
+# reading more text only when the buffered part ends mid-value
+class JsonReader:
+    def __init__(self, stream, chunk_size=DECODE_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.exhausted = False
+
+    def fill(self):
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.exhausted = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer) or not self.fill():
+                return self.buffer[self.position:self.position + 1]
+
+    def consume(self, char):
+        if self.peek() == char:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, char):
+        if not self.consume(char):
+            raise ValueError(f"Expected '{char}' at offset {self.position} of the decoded payload")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number cut at the end of the buffer would parse short: require a delimiter
+                if end < len(self.buffer) or self.exhausted:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.exhausted:
+                    raise
+            self.fill()
+
+
+# Lazily yields (header, log event) pairs from a base64 gzip CloudWatch Logs subscription
+# payload. The header fields (owner, logGroup, logStream, ...) precede logEvents in every
+# payload CloudWatch Logs writes, so each event is yielded as soon as it is parsed
+def stream_log_events(data):
+    text = io.TextIOWrapper(gzip.GzipFile(fileobj=io.BufferedReader(Base64Reader(data))), encoding='utf-8')
+    reader = JsonReader(text)
+    header = {}
+    reader.expect('{')
+    while not reader.consume('}'):
+        key = reader.value()
+        reader.expect(':')
+        if key == 'logEvents':
+            reader.expect('[')
+            while not reader.consume(']'):
+                yield header, reader.value()
+                reader.consume(',')
+        else:
+            header[key] = reader.value()
+        reader.consume(',')
+
+
+# Same pairs as stream_log_events, from a payload decoded in one go
+def load_log_events(data):
+    payload = json.loads(gzip.decompress(base64.b64decode(data)))
+    if not isinstance(payload, dict):
+        raise ValueError('Expected a JSON object in the decoded payload')
+    header = {key: value for key, value in payload.items() if key != 'logEvents'}
+    for log_event in payload.get('logEvents', []):
+        yield header, log_event
+
+
+def iter_log_events(data):
+    if len(data) >= STREAM_DECODE_MIN_BYTES:
+        return stream_log_events(data)
+    return load_log_events(data)
+
+
+# One structured event per log line the filter rules keep; control messages (the
+# subscription's connectivity check) and blank lines are not forwarded
+def log_event_details(data):
+    for header, log_event in iter_log_events(data):
+        if header.get('messageType') == 'CONTROL_MESSAGE':
+            metrics.add('ControlMessagesSkipped')
+            return
+        message = log_event.get('message', '')
+        if not message.strip():
+            continue
+        forward, level = log_filter.evaluate(message, header.get('logGroup'), header.get('logStream'), log_event.get('id'))
+        if not forward:
+            continue
+        yield {
+            'owner': header.get('owner'),
+            'logGroup': header.get('logGroup'),
+            'logStream': header.get('logStream'),
+            'id': log_event.get('id'),
+            'timestamp': log_event.get('timestamp'),
+            'level': level,
+            'message': message
+        }
+
+
+# Event details of one input record: the log lines of CloudWatch Logs data, else the record
+# itself as before
+def record_details(record):
+    data = record.get('data') if isinstance(record, dict) else None
+    if isinstance(data, str) and data.startswith(GZIP_BASE64_PREFIX):
+        yield from log_event_details(data)
+    else:
+        yield record
+
+
+def build_entry(record):
+    # json.dumps escapes non-ASCII characters, so the string length is its UTF-8 size
+    detail = json.dumps(record)
+    entry = {
+        'Source': SOURCE,
+        'DetailType': DETAIL_TYPE,
+        'Detail': detail,
+        'EventBusName': EVENT_BUS_NAME
+    }
+    return entry, ENTRY_OVERHEAD_BYTES + len(detail)
+
+
+def failed(error_code, error_message):
+    return {'status': 'Failed', 'errorCode': error_code, 'errorMessage': error_message}
+
+
+# Collects per-event outcomes into one outcome per input record: a record is forwarded when
+# every event decoded from it was
+class RecordOutcomes:
+    def __init__(self, count):
+        self.forwarded = [0] * count
+        self.errors = {}
+
+    def add(self, index, outcome):
+        if outcome['status'] == 'Forwarded':
+            self.forwarded[index] += 1
+        else:
+            self.errors.setdefault(index, outcome)
+
+    def results(self):
+        return [
+            {**self.errors.get(index, {'status': 'Forwarded'}), 'events': forwarded}
+            for index, forwarded in enumerate(self.forwarded)
+        ]
+
+
+# Yields (record index, event detail) for every record, lazily. A record whose data cannot be
+# decoded fails on its own; the events already read from it still go out
+def iter_details(records, outcomes):
+    for index, record in enumerate(records):
+        try:
+            for detail in record_details(record):
+                yield index, detail
+        except DECODE_ERRORS as e:
+            print(f"Failed to decode record {index}: {str(e)}")
+            outcomes.add(index, failed('DecodeError', str(e)))
+
+
+# Packs (record index, event detail) pairs into PutEvents requests of (record index, entry)
+# pairs, each detail serialized and measured exactly once. Events larger than a whole request
+# can never be sent and fail their record
+def pack_entries(details, outcomes=None):
+    batch, batch_bytes = [], 0
+    for index, detail in details:
+        entry, size = build_entry(detail)
+        if size > MAX_REQUEST_BYTES:
+            print(f"Skipping an event of record {index} of {size} bytes, above the {MAX_REQUEST_BYTES} bytes PutEvents limit")
+            metrics.add('EventsOversized')
+            if outcomes is not None:
+                outcomes.add(index, failed('EntryTooLarge', f"{size} bytes exceeds {MAX_REQUEST_BYTES}"))
+            continue
+        if len(batch) == MAX_ENTRIES_PER_REQUEST or batch_bytes + size > MAX_REQUEST_BYTES:
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append((index, entry))
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def backoff_delay(attempt):
+    # Full jitter: a random delay up to the capped exponential step
+    return random.uniform(0, min(PUT_EVENTS_BACKOFF_CAP, PUT_EVENTS_BACKOFF_BASE * 2 ** attempt))
+
+
+# Sends one packed batch, resending only the entries PutEvents rejected with a retryable error
+# until they succeed, run out of attempts or would outlive the deadline. Returns a
+# (record index, outcome) pair for every entry of the batch
+def send_batch(batch, deadline):
+    outcomes = [None] * len(batch)
+    pending = list(range(len(batch)))
+    for attempt in range(PUT_EVENTS_MAX_ATTEMPTS):
+        try:
+            with metrics.timer('PutEventsLatency'):
+                response = client.put_events(Entries=[batch[position][1] for position in pending])
+        except (BotoCoreError, ClientError) as e:
+            # The whole request failed (botocore has already retried throttles); resend it all
+            retry, error = pending, failed('RequestFailed', str(e))
+        else:
+            retry = []
+            for position, result in zip(pending, response['Entries']):
+                if 'EventId' in result:
+                    outcomes[position] = {'status': 'Forwarded', 'eventId': result['EventId']}
+                else:
+                    outcomes[position] = failed(result.get('ErrorCode'), result.get('ErrorMessage'))
+                    if result.get('ErrorCode') in RETRYABLE_ERROR_CODES:
+                        retry.append(position)
+            error = None
+        if not retry:
+            break
+        delay = backoff_delay(attempt)
+        if attempt + 1 == PUT_EVENTS_MAX_ATTEMPTS or time.monotonic() + delay > deadline:
+            break
+        print(f"PutEvents did not accept {len(retry)} of {len(pending)} entries, retrying in {delay:.2f}s")
+        metrics.add('PutEventsRetries')
+        time.sleep(delay)
+        pending = retry
+    # Rejected entries keep their last error; a failed request fails every entry it carried
+    if error is not None:
+        for position in retry:
+            outcomes[position] = error
+    return [(index, outcome) for (index, _), outcome in zip(batch, outcomes)]
+
+
+# Firehose transformation mode: each record comes back in place, with the structured events
+# its log lines yield as newline-delimited JSON, so Firehose buffers them to S3 and no
+# PutEvents call is made. Records whose lines are all filtered out are Dropped, records that
+# cannot be decoded ProcessingFailed; data that is not CloudWatch Logs passes through as is.
+# Records that would push the response past the Lambda payload limit are ProcessingFailed,
+# which sends them to the stream's error output instead of failing the whole invocation.
+# Decoded lines are several times larger than their gzip input, so keep the processor's
+# BufferSizeInMBs at 1 or below for CloudWatch Logs sources
+def transform_records(records):
+    results = []
+    response_bytes = 0
+    counts = {'Ok': 0, 'Dropped': 0, 'ProcessingFailed': 0}
+    for record in records:
+        data = record['data']
+        result = {'recordId': record['recordId'], 'result': 'Ok', 'data': data}
+        if data.startswith(GZIP_BASE64_PREFIX):
+            try:
+                lines = [json.dumps(detail) for detail in log_event_details(data)]
+            except DECODE_ERRORS as e:
+                print(f"Failed to decode record {record['recordId']}: {str(e)}")
+                result = {'recordId': record['recordId'], 'result': 'ProcessingFailed'}
+            else:
+                if lines:
+                    result['data'] = base64.b64encode(('\n'.join(lines) + '\n').encode('utf-8')).decode('ascii')
+                else:
+                    result = {'recordId': record['recordId'], 'result': 'Dropped'}
+        size = len(result.get('data', '')) + len(result['recordId']) + FIREHOSE_RECORD_OVERHEAD_BYTES
+        if response_bytes + size > FIREHOSE_RESPONSE_LIMIT_BYTES:
+            print(f"Record {record['recordId']} does not fit in the {FIREHOSE_RESPONSE_LIMIT_BYTES} bytes response")
+            metrics.add('RecordsOverflowed')
+            result = {'recordId': record['recordId'], 'result': 'ProcessingFailed'}
+            size = len(result['recordId']) + FIREHOSE_RECORD_OVERHEAD_BYTES
+        response_bytes += size
+        counts[result['result']] += 1
+        results.append(result)
+
+    metrics.add('RecordsProcessed', counts['Ok'])
+    metrics.add('RecordsDropped', counts['Dropped'])
+    metrics.add('RecordsFailed', counts['ProcessingFailed'])
+    if counts['ProcessingFailed']:
+        print(f"Failed to transform {counts['ProcessingFailed']} of {len(records)} records")
+    return {'records': results}
+
+
+# Sends the events of every record to EventBridge and reports one outcome per record
+def forward_records(records, context):
+    remaining = context.get_remaining_time_in_millis() / 1000 if context is not None else 900
+    deadline = time.monotonic() + remaining - DEADLINE_MARGIN_SECONDS
+
+    # Records are decoded, packed and sent as a stream: batches go out concurrently, each one
+    # retrying its own rejected entries, and at most two per worker wait in memory
+    outcomes = RecordOutcomes(len(records))
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=PUT_EVENTS_WORKERS) as pool:
+        for batch in pack_entries(iter_details(records, outcomes), outcomes):
+            if len(in_flight) >= 2 * PUT_EVENTS_WORKERS:
+                for index, outcome in in_flight.popleft().result():
+                    outcomes.add(index, outcome)
+            in_flight.append(pool.submit(send_batch, batch, deadline))
+        while in_flight:
+            for index, outcome in in_flight.popleft().result():
+                outcomes.add(index, outcome)
+
+    results = outcomes.results()
+    failed_count = len(outcomes.errors)
+    metrics.add('RecordsProcessed', len(records) - failed_count)
+    metrics.add('RecordsFailed', failed_count)
+    metrics.add('EventsForwarded', sum(outcomes.forwarded))
+    if failed_count:
+        print(f"Failed to forward {failed_count} of {len(records)} records")
     return {
-        'statusCode': 200,
-        'body': json.dumps('Logs forwarded to EventBridge')
+        'statusCode': 207 if failed_count else 200,
+        'body': json.dumps(f"Forwarded {len(records) - failed_count} of {len(records)} records to EventBridge"),
+        'records': results
     }
+
+
+# Accepts a Firehose transformation event (it carries the deliveryStreamArn), a CloudWatch Logs
+# subscription event ({"awslogs": {"data": ...}}) or a list of records under "records", each
+# either CloudWatch Logs data or a plain record forwarded as is
+@metrics.instrument
+def lambda_handler(event, context):
+    if 'deliveryStreamArn' in event:
+        response = transform_records(event['records'])
+    else:
+        response = forward_records([event['awslogs']] if 'awslogs' in event else event['records'], context)
+
+    lines = log_filter.take_counts()
+    metrics.add('LinesForwarded', lines['forwarded'])
+    metrics.add('LinesDropped', lines['dropped'])
+    metrics.add('LinesSampledOut', lines['sampled_out'])
+    if lines['dropped'] or lines['sampled_out']:
+        print(f"Filtered log lines: {json.dumps(lines)}")
+    return response
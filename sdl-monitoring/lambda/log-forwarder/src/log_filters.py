@@ -0,0 +1,141 @@
+import fnmatch
+import json
+import random
+import re
+import zlib
+from functools import lru_cache
+
+# Declarative log line filters, compiled once per container and applied before any line is
+# packed for PutEvents.
+#
+#   {"default_action": "forward",
+#    "rules": [
+#     {"name": "debug-noise", "action": "drop", "levels": ["DEBUG", "TRACE"]},
+#     {"name": "errors", "action": "forward", "levels": ["ERROR", "FATAL"]},
+#     {"name": "stack-traces", "action": "forward", "contains": ["Exception", "Traceback"]},
+#     {"name": "spark-info", "action": "sample", "rate": 0.01, "log_groups": ["/aws-glue/jobs/*"],
+#      "levels": ["INFO"]},
+#     {"name": "billing-progress", "action": "drop", "jobs": ["billing-*"], "pattern": "Processed \\d+ rows"}
+#   ]}
+#
+# 'log_groups' are globs over the log group and 'jobs' globs over the log stream, which Glue
+# starts with the job's --continuous-log-logStreamPrefix (and otherwise names after the run
+# id). 'levels' are exact levels read from the start of the line (WARNING counts as WARN),
+# 'contains' substrings and 'pattern' a regex searched in the line.
+# A rule without a matcher matches everything on that dimension. The first matching rule
+# decides: 'forward', 'drop', or 'sample' to forward a 'rate' share of the lines, chosen by
+# log event id so a redelivered batch samples the same lines. Lines no rule matches get the
+# default action.
+
+ACTIONS = ('forward', 'drop', 'sample')
+# Log4j, Spark and Python logging all put the level within the first few tokens of a line
+LEVEL_PATTERN = re.compile(r'(?<![A-Za-z])(TRACE|DEBUG|INFO|WARN(?:ING)?|ERROR|FATAL|CRITICAL)(?![A-Za-z])')
+LEVEL_SCAN_CHARS = 120
+LEVEL_ALIASES = {'WARNING': 'WARN', 'CRITICAL': 'FATAL'}
+
+
+def load_filter_rules(path):
+    with open(path) as rules_file:
+        config = json.load(rules_file)
+    return config.get('rules', []), config.get('default_action', 'forward')
+
+
+def line_level(message):
+    match = LEVEL_PATTERN.search(message, 0, LEVEL_SCAN_CHARS)
+    if match is None:
+        return None
+    level = match.group(1)
+    return LEVEL_ALIASES.get(level, level)
+
+
+def _globs(patterns):
+    if patterns is None:
+        return None
+    return re.compile('|'.join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns))
+
+
+class CompiledFilterRule:
+
+    def __init__(self, position, rule):
+        self.position = position
+        self.name = rule.get('name', f"rule-{position}")
+        self.action = rule.get('action', 'forward')
+        if self.action not in ACTIONS:
+            raise ValueError(f"Filter rule {self.name}: unknown action {self.action}")
+        self.rate = float(rule.get('rate', 1))
+        if self.action == 'sample' and not 0 <= self.rate <= 1:
+            raise ValueError(f"Filter rule {self.name}: sample rate must be between 0 and 1")
+        self.log_groups = _globs(rule.get('log_groups'))
+        self.jobs = _globs(rule.get('jobs'))
+        self.levels = None if rule.get('levels') is None else {
+            LEVEL_ALIASES.get(level.upper(), level.upper()) for level in rule['levels']
+        }
+        # Substrings and the pattern are folded into one regex searched once per line
+        text_patterns = [re.escape(text) for text in rule.get('contains', [])]
+        if rule.get('pattern'):
+            text_patterns.append(f"(?:{rule['pattern']})")
+        self.text = re.compile('|'.join(text_patterns)) if text_patterns else None
+
+    def matches_source(self, log_group, job, level):
+        return ((self.log_groups is None or self.log_groups.match(log_group or '') is not None)
+                and (self.jobs is None or self.jobs.match(job or '') is not None)
+                and (self.levels is None or level in self.levels))
+
+
+class LogFilter:
+
+    def __init__(self, rules, default_action='forward'):
+        if default_action not in ('forward', 'drop'):
+            raise ValueError(f"Unknown default filter action {default_action}")
+        self.rules = [CompiledFilterRule(position, rule) for position, rule in enumerate(rules)]
+        self.default_action = default_action
+        self.forwarded = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.by_rule = {}
+        # A batch holds thousands of lines from a handful of groups, jobs and levels: the rules
+        # left after the message-independent matchers are resolved once per combination
+        self._candidates = lru_cache(maxsize=4096)(self._match_source)
+
+    def _match_source(self, log_group, job, level):
+        return tuple(rule for rule in self.rules if rule.matches_source(log_group, job, level))
+
+    # Returns (forward the line?, level) and counts the decision under the deciding rule
+    def evaluate(self, message, log_group=None, job=None, event_id=None):
+        level = line_level(message)
+        decided_by = next(
+            (rule for rule in self._candidates(log_group, job, level)
+             if rule.text is None or rule.text.search(message) is not None),
+            None
+        )
+        if decided_by is None:
+            forward = self.default_action == 'forward'
+        elif decided_by.action == 'sample':
+            forward = self._sampled(decided_by, event_id)
+            if not forward:
+                self.sampled_out += 1
+        else:
+            forward = decided_by.action == 'forward'
+        if forward:
+            self.forwarded += 1
+        elif decided_by is None or decided_by.action == 'drop':
+            self.dropped += 1
+        key = decided_by.name if decided_by is not None else 'default'
+        self.by_rule[key] = self.by_rule.get(key, 0) + 1
+        return forward, level
+
+    @staticmethod
+    def _sampled(rule, event_id):
+        if event_id is None:
+            return random.random() < rule.rate
+        return zlib.crc32(str(event_id).encode('utf-8')) / 2 ** 32 < rule.rate
+
+    # Returns and resets the counts since the last call
+    def take_counts(self):
+        counts = {
+            'forwarded': self.forwarded, 'dropped': self.dropped,
+            'sampled_out': self.sampled_out, 'by_rule': self.by_rule
+        }
+        self.forwarded = self.dropped = self.sampled_out = 0
+        self.by_rule = {}
+        return counts
@@ -0,0 +1,92 @@
+import base64
+import gzip
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+sys.path[:0] = [SRC, os.path.join(SRC, *[os.pardir] * 4, 'sdl-common', 'lambda', 'src')]
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+import lambda_function
+
+
+class RecordingClient:
+    def __init__(self):
+        self.entries = []
+
+    def put_events(self, Entries):
+        self.entries.extend(Entries)
+        return {'FailedEntryCount': 0, 'Entries': [{'EventId': str(index)} for index, _ in enumerate(Entries)]}
+
+
+def log_data(messages):
+    payload = {
+        'messageType': 'DATA_MESSAGE', 'owner': '123456789012', 'logGroup': '/aws-glue/jobs/output',
+        'logStream': 'jr_1', 'subscriptionFilters': ['glue-logs'],
+        'logEvents': [{'id': str(index), 'timestamp': 1700000000000 + index, 'message': message}
+                      for index, message in enumerate(messages)]
+    }
+    return base64.b64encode(gzip.compress(json.dumps(payload).encode('utf-8'))).decode('ascii')
+
+
+# A valid gzip header followed by a corrupt deflate body: decoding raises zlib.error
+def corrupt_log_data():
+    compressed = gzip.compress(json.dumps({'logEvents': [{'message': 'x' * 5000}]}).encode('utf-8'))
+    body = bytes(byte ^ 0x5a for byte in compressed[10:-8])
+    return base64.b64encode(compressed[:10] + body + compressed[-8:]).decode('ascii')
+
+
+class CorruptPayloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = lambda_function.client = RecordingClient()
+
+    def test_corrupt_record_fails_alone_when_forwarding(self):
+        response = lambda_function.lambda_handler(
+            {'records': [{'data': corrupt_log_data()}, {'data': log_data(['INFO started'])}]}, None
+        )
+        self.assertEqual([outcome['status'] for outcome in response['records']], ['Failed', 'Forwarded'])
+        self.assertEqual(response['records'][0]['errorCode'], 'DecodeError')
+        self.assertEqual(len(self.client.entries), 1)
+
+    def test_corrupt_record_fails_alone_when_streamed(self):
+        with mock.patch.object(lambda_function, 'STREAM_DECODE_MIN_BYTES', 0):
+            self.test_corrupt_record_fails_alone_when_forwarding()
+
+    def test_corrupt_record_fails_alone_in_firehose_mode(self):
+        response = lambda_function.lambda_handler({
+            'invocationId': 'invocation', 'deliveryStreamArn': 'arn:aws:firehose:us-east-1:123456789012:deliverystream/logs',
+            'records': [{'recordId': '1', 'data': corrupt_log_data()}, {'recordId': '2', 'data': log_data(['INFO started'])}]
+        }, None)
+        results = {record['recordId']: record for record in response['records']}
+        self.assertEqual(results['1']['result'], 'ProcessingFailed')
+        self.assertEqual(results['2']['result'], 'Ok')
+        self.assertEqual(json.loads(base64.b64decode(results['2']['data']))['message'], 'INFO started')
+        self.assertEqual(self.client.entries, [])
+
+
+
+class DecodeTest(unittest.TestCase):
+
+    def test_eager_and_streaming_decode_agree(self):
+        data = log_data(['INFO started', '   ', 'ERROR Exception in stage 1', 'WARN slow task'])
+        eager = list(lambda_function.log_event_details(data))
+        with mock.patch.object(lambda_function, 'STREAM_DECODE_MIN_BYTES', 0):
+            streamed = list(lambda_function.log_event_details(data))
+        self.assertTrue(eager)
+        self.assertEqual(streamed, eager)
+
+    def test_non_object_payload_is_a_decode_error(self):
+        data = base64.b64encode(gzip.compress(b'[1, 2]')).decode('ascii')
+        for threshold in (len(data) + 1, 0):
+            with mock.patch.object(lambda_function, 'STREAM_DECODE_MIN_BYTES', threshold):
+                with self.assertRaises(lambda_function.DECODE_ERRORS):
+                    list(lambda_function.log_event_details(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import argparse
+import os
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 4, 'sdl-common', 'lambda', 'src'))
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+import requests
+import urllib3
+import notifier
+
+# Per-notification cost of posting to the Teams webhook with a bare requests.post, which opens
+# a new connection (and TLS handshake) per call, against the notifier's pooled keep-alive
+# session, with the same (connect, read) timeouts. The webhook is a local HTTP/1.1 stub server
+# answering after a fixed latency; pass a certificate and key to serve it over TLS, e.g.
+#   openssl req -x509 -newkey rsa:2048 -nodes -keyout key.pem -out cert.pem -days 1 -subj /CN=localhost
+#
+# Usage:
+#   python benchmark_webhook.py [--posts 300] [--latency-ms 0] [--certfile cert.pem --keyfile key.pem]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark bare requests.post vs the pooled webhook session')
+    parser.add_argument('--posts', type=int, default=300, help='Notifications to post per mode')
+    parser.add_argument('--latency-ms', type=float, default=0, help='Simulated webhook response time')
+    parser.add_argument('--certfile', help='Serve the stub over TLS with this certificate')
+    parser.add_argument('--keyfile', help='Private key of the certificate')
+    return parser.parse_args(argv)
+
+
+class WebhookStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    connections = 0
+    lock = threading.Lock()
+    # Send each response at once, or delayed ACKs stall every keep-alive request by ~40 ms
+    disable_nagle_algorithm = True
+
+    # Called once per accepted connection; keep-alive requests reuse the handler
+    def setup(self):
+        with self.lock:
+            WebhookStub.connections += 1
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Length', '1')
+        self.end_headers()
+        self.wfile.write(b'1')
+
+    def log_message(self, *args):
+        pass
+
+
+# The stub's certificate is self-signed, so neither mode verifies it
+def post_bare(url, payload, timeout):
+    requests.post(url, json=payload, timeout=timeout, verify=False).raise_for_status()
+
+
+def post_pooled(url, payload, timeout):
+    notifier.http.post(url, json=payload, timeout=timeout, verify=False).raise_for_status()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    WebhookStub.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookStub)
+    scheme = 'http'
+    if args.certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(args.certfile, args.keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    url = f"{scheme}://localhost:{server.server_port}/webhook"
+    payload = {'title': 'Glue Job State Change', 'text': "Glue Job 'benchmark' has reached state: SUCCEEDED"}
+    timeout = (notifier.TEAMS_CONNECT_TIMEOUT, notifier.TEAMS_READ_TIMEOUT)
+    print(f"{args.posts} posts over {scheme}, {args.latency_ms:.0f} ms webhook latency")
+    print(f"{'mode':16} {'connections':>11} {'ms/notification':>16}")
+    for mode, post in (('bare post', post_bare), ('pooled session', post_pooled)):
+        WebhookStub.connections = 0
+        started = time.perf_counter()
+        for _ in range(args.posts):
+            post(url, payload, timeout)
+        elapsed = time.perf_counter() - started
+        print(f"{mode:16} {WebhookStub.connections:11} {elapsed / args.posts * 1000:16.2f}")
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
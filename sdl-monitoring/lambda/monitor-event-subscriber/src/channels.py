@@ -0,0 +1,147 @@
+import os
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from notifier import (
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS, TEAMS_CONNECT_TIMEOUT, TEAMS_READ_TIMEOUT,
+    CircuitBreaker, NotificationError, RetryBudget, TokenBucket, call_through_breaker, post_with_retry
+)
+from metrics import metrics
+
+# Notification channels. A notification is a dict with 'title', 'message', 'emoji', 'state',
+# 'entity_type' and 'name'; every channel formats it for its own transport and delivers it
+# with its own timeout, rate limiter and circuit breaker, so one slow or failing channel
+# never holds up the others.
+
+
+def channel_setting(name, setting, default):
+    return os.environ.get(f"{name.upper()}_{setting}", default)
+
+
+class Channel:
+
+    def __init__(self, name):
+        self.name = name
+        self.timeout_seconds = float(channel_setting(name, 'TIMEOUT_SECONDS', '20'))
+        self.breaker = CircuitBreaker(
+            int(channel_setting(name, 'BREAKER_FAILURE_THRESHOLD', BREAKER_FAILURE_THRESHOLD)),
+            float(channel_setting(name, 'BREAKER_RESET_SECONDS', BREAKER_RESET_SECONDS))
+        )
+
+    def format(self, notification):
+        raise NotImplementedError
+
+    def deliver(self, payload, budget):
+        raise NotImplementedError
+
+    # The channel's own deadline, never past the invocation's retry budget
+    def channel_budget(self, budget):
+        return RetryBudget(seconds=min(self.timeout_seconds, budget.remaining()))
+
+    def send(self, payload, budget):
+        return call_through_breaker(self.breaker, self.deliver, payload, self.channel_budget(budget))
+
+
+class WebhookChannel(Channel):
+
+    def __init__(self, name, url_provider, rate_per_second, burst):
+        super().__init__(name)
+        self.url_provider = url_provider
+        self.limiter = TokenBucket(
+            float(channel_setting(name, 'RATE_PER_SECOND', rate_per_second)),
+            int(channel_setting(name, 'BURST', burst))
+        )
+        self.http_timeout = (
+            float(channel_setting(name, 'CONNECT_TIMEOUT', TEAMS_CONNECT_TIMEOUT)),
+            float(channel_setting(name, 'READ_TIMEOUT', TEAMS_READ_TIMEOUT))
+        )
+
+    # The URL is looked up outside the breaker: a failed secret lookup says nothing about the
+    # endpoint, and surfaces as a NotificationError so the payload is dead-lettered
+    def send(self, payload, budget):
+        try:
+            url = self.url_provider()
+        except Exception as e:
+            raise NotificationError(f"Webhook URL unavailable: {str(e)}")
+        return call_through_breaker(self.breaker, self.deliver, payload, self.channel_budget(budget), url)
+
+    def deliver(self, payload, budget, url):
+        # The breaker is applied once around the whole delivery by send
+        return post_with_retry(url, payload, budget, limiter=self.limiter, breaker=_NO_BREAKER,
+                               timeout=self.http_timeout)
+
+
+class TeamsChannel(WebhookChannel):
+
+    def __init__(self, url_provider):
+        super().__init__('teams', url_provider, '2', '4')
+
+    def format(self, notification):
+        return {
+            "title": notification['title'],
+            "text": f"{notification['emoji']} **{notification['title']}**\n\n{notification['message']}"
+        }
+
+
+class SlackChannel(WebhookChannel):
+
+    def __init__(self, url_provider):
+        super().__init__('slack', url_provider, '1', '2')
+
+    def format(self, notification):
+        return {"text": f"{notification['emoji']} *{notification['title']}*\n{notification['message']}"}
+
+
+class EmailChannel(Channel):
+
+    def __init__(self, topic_arn):
+        super().__init__('email')
+        self.topic_arn = topic_arn
+        self.client = boto3.client('sns', config=Config(
+            connect_timeout=float(channel_setting('email', 'CONNECT_TIMEOUT', '3')),
+            read_timeout=float(channel_setting('email', 'READ_TIMEOUT', '5')),
+            retries={'max_attempts': 3, 'mode': 'standard'}
+        ))
+
+    def format(self, notification):
+        return {
+            # SNS email subjects are limited to 100 printable ASCII characters
+            "subject": notification['title'].encode('ascii', 'ignore').decode()[:100],
+            "message": notification['message']
+        }
+
+    def deliver(self, payload, budget):
+        try:
+            with metrics.timer('SnsPublishLatency'):
+                return self.client.publish(TopicArn=self.topic_arn, Subject=payload['subject'], Message=payload['message'])
+        except (BotoCoreError, ClientError) as e:
+            raise NotificationError(f"Exception: {str(e)}")
+
+
+# Breaker stand-in for calls whose breaker is handled by the caller
+class _NoBreaker:
+
+    def allow_request(self):
+        return True
+
+    def record_success(self):
+        pass
+
+    def record_failure(self):
+        pass
+
+
+_NO_BREAKER = _NoBreaker()
+
+
+# Routes a notification to channels through the compiled rules engine
+class Router:
+
+    def __init__(self, channels, engine):
+        self.channels = channels
+        self.engine = engine
+
+    # Returns the selected channels and the name of the suppressing rule, if any
+    def select(self, notification):
+        names, suppressed_by = self.engine.evaluate(notification)
+        return [self.channels[name] for name in names if name in self.channels], suppressed_by
@@ -0,0 +1,122 @@
+import calendar
+import json
+import os
+from botocore.exceptions import ClientError
+from datetime import datetime, timedelta
+from metrics import metrics
+
+DIGEST_MODE = os.environ.get('DIGEST_MODE', 'false').lower() == 'true'
+DIGEST_WINDOW_MINUTES = int(os.environ.get('DIGEST_WINDOW_MINUTES', '5'))
+DIGEST_PREFIX = os.environ.get('DIGEST_PREFIX', 'digest/teams')
+# Longest a flush can run (the Lambda maximum); an older claim was left by a crashed flush
+DIGEST_CLAIM_SECONDS = int(os.environ.get('DIGEST_CLAIM_SECONDS', '900'))
+
+# State changes are buffered in the monitoring bucket under
+#   {DIGEST_PREFIX}/pending/window=YYYYmmddTHHMM/{request_id}.json
+# and a scheduled invocation turns every closed window into a single summary card.
+# A flush claims a window with a conditional write of {DIGEST_PREFIX}/claimed/window=...
+# before reading it, so overlapping flushes never send the same buffers. It deletes only the
+# buffers it read, then releases the claim: a buffer that landed after the read, or a window
+# that could not be claimed or read, is picked up by the next flush. A digest a channel could
+# not take is dead-lettered for a replay, like any other notification.
+
+
+def window_start(moment, minutes=DIGEST_WINDOW_MINUTES):
+    seconds = calendar.timegm(moment.utctimetuple())
+    return datetime.utcfromtimestamp(seconds - seconds % (minutes * 60))
+
+
+def window_label(window):
+    return window.strftime('%Y%m%dT%H%M')
+
+
+# Function to buffer one invocation's digest items in the window they arrived in
+def buffer_items(s3, bucket, items, request_id, now=None):
+    window = window_label(window_start(now or datetime.utcnow()))
+    body = '\n'.join(json.dumps(item) for item in items) + '\n'
+    with metrics.timer('S3PutLatency'):
+        s3.put_object(
+            Bucket=bucket,
+            Key=f"{DIGEST_PREFIX}/pending/window={window}/{request_id}.json",
+            Body=body.encode('utf-8'),
+            ContentType='application/x-ndjson'
+        )
+
+
+# Function to list the buffered windows whose end has already passed
+def closed_windows(s3, bucket, now=None):
+    now = now or datetime.utcnow()
+    paginator = s3.get_paginator('list_objects_v2')
+    windows = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{DIGEST_PREFIX}/pending/", Delimiter='/'):
+        for common_prefix in page.get('CommonPrefixes', []):
+            label = common_prefix['Prefix'].rstrip('/').rsplit('window=', 1)[1]
+            window = datetime.strptime(label, '%Y%m%dT%H%M')
+            if window + timedelta(minutes=DIGEST_WINDOW_MINUTES) <= now:
+                windows.append(window)
+    return sorted(windows)
+
+
+def read_window(s3, bucket, window):
+    paginator = s3.get_paginator('list_objects_v2')
+    items, keys = [], []
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{DIGEST_PREFIX}/pending/window={window_label(window)}/"):
+        for obj in page.get('Contents', []):
+            body = s3.get_object(Bucket=bucket, Key=obj['Key'])['Body'].read().decode('utf-8')
+            items.extend(json.loads(line) for line in body.splitlines() if line)
+            keys.append(obj['Key'])
+    return items, keys
+
+
+def claim_key(window):
+    return f"{DIGEST_PREFIX}/claimed/window={window_label(window)}"
+
+
+# Function to take ownership of a window for one flush; returns False while another flush holds
+# it. A claim older than DIGEST_CLAIM_SECONDS is released so the next flush can take over
+def claim_window(s3, bucket, window, now=None):
+    try:
+        s3.put_object(Bucket=bucket, Key=claim_key(window), Body=b'', IfNoneMatch='*')
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            raise
+        try:
+            claimed_at = s3.head_object(Bucket=bucket, Key=claim_key(window))['LastModified']
+        except ClientError:
+            # Released in the meantime
+            return False
+        if (now or datetime.utcnow()) - claimed_at.replace(tzinfo=None) >= timedelta(seconds=DIGEST_CLAIM_SECONDS):
+            print(f"Releasing stale digest claim of window {window_label(window)}")
+            release_window(s3, bucket, window)
+        return False
+    return True
+
+
+def release_window(s3, bucket, window):
+    s3.delete_object(Bucket=bucket, Key=claim_key(window))
+
+
+def delete_keys(s3, bucket, keys):
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in keys[i:i + 1000]], 'Quiet': True}
+        )
+
+
+# Function to build the summary card for a window, grouped by job/crawler and state
+def build_digest(items, window):
+    groups = {}
+    for item in items:
+        group = (item['entity_type'], item['name'], item['state'])
+        groups[group] = groups.get(group, 0) + 1
+
+    window_end = window + timedelta(minutes=DIGEST_WINDOW_MINUTES)
+    title = f"Glue Pipeline Digest {window.strftime('%Y-%m-%d %H:%M')}-{window_end.strftime('%H:%M')} UTC"
+    lines = []
+    for (entity_type, name, state), count in sorted(groups.items()):
+        label = {'job': 'Glue Job', 'crawler': 'Glue Crawler'}.get(entity_type, 'Unknown')
+        emoji = "✅" if state in ["SUCCEEDED", "Succeeded"] else "ℹ️"
+        lines.append(f"- {emoji} {label} '{name}': {state} x{count}")
+    message = f"{len(items)} state changes in this window:\n\n" + '\n'.join(lines)
+    return title, message, "📋"
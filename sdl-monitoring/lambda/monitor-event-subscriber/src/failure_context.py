@@ -0,0 +1,107 @@
+import calendar
+import os
+import time
+import boto3
+from botocore.config import Config
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from datetime import timedelta
+from metrics import metrics
+
+# Context for a failed Glue job run: the run's ErrorMessage and the last error lines of its
+# log stream. The log query is confined to the run's own stream in the error log group, to a
+# short window before the event and to lines that look like errors, and the whole fetch runs
+# against a latency budget. Past the budget the notification goes out with whatever has
+# arrived and the context is marked incomplete.
+
+CONTEXT_STATES = {'FAILED', 'TIMEOUT', 'ERROR'}
+FAILURE_LOG_GROUP = os.environ.get('FAILURE_LOG_GROUP', '/aws-glue/jobs/error')
+FAILURE_CONTEXT_LINES = int(os.environ.get('FAILURE_CONTEXT_LINES', '20'))
+FAILURE_CONTEXT_WINDOW_MINUTES = int(os.environ.get('FAILURE_CONTEXT_WINDOW_MINUTES', '15'))
+FAILURE_CONTEXT_BUDGET_SECONDS = float(os.environ.get('FAILURE_CONTEXT_BUDGET_SECONDS', '3'))
+MAX_LINE_LENGTH = 500
+ERROR_FILTER_PATTERN = '?ERROR ?Error ?Exception ?Traceback'
+
+
+def epoch_millis(moment):
+    return calendar.timegm(moment.utctimetuple()) * 1000
+
+
+class FailureContext:
+
+    def __init__(self, job_metrics, log_group=FAILURE_LOG_GROUP, lines=FAILURE_CONTEXT_LINES,
+                 window_minutes=FAILURE_CONTEXT_WINDOW_MINUTES, budget_seconds=FAILURE_CONTEXT_BUDGET_SECONDS,
+                 client=None):
+        self.job_metrics = job_metrics
+        self.log_group = log_group
+        self.lines = lines
+        self.window = timedelta(minutes=window_minutes)
+        self.budget_seconds = budget_seconds
+        self.client = client
+        # Fetches that overrun the budget finish here without holding up the invocation
+        self.executor = ThreadPoolExecutor(max_workers=8)
+
+    def _logs(self):
+        if self.client is None:
+            self.client = boto3.client('logs', config=Config(
+                connect_timeout=1, read_timeout=self.budget_seconds, retries={'max_attempts': 1}
+            ))
+        return self.client
+
+    def _error_lines(self, run_id, moment, deadline):
+        lines = deque(maxlen=self.lines)
+        request = {
+            'logGroupName': self.log_group,
+            'logStreamNames': [run_id],
+            'startTime': epoch_millis(moment - self.window),
+            'endTime': epoch_millis(moment + timedelta(minutes=1)),
+            'filterPattern': ERROR_FILTER_PATTERN
+        }
+        while time.monotonic() < deadline:
+            try:
+                with metrics.timer('LogsApiLatency'):
+                    response = self._logs().filter_log_events(**request)
+            except self._logs().exceptions.ResourceNotFoundException:
+                # The run wrote no error stream
+                return list(lines), True
+            lines.extend(event['message'].rstrip()[:MAX_LINE_LENGTH] for event in response['events'])
+            if 'nextToken' not in response:
+                return list(lines), True
+            request['nextToken'] = response['nextToken']
+        return list(lines), False
+
+    def _error_message(self, job_name, run_id):
+        run_values = self.job_metrics.get_many([(job_name, run_id)])
+        return run_values.get((job_name, run_id), {}).get('error_message')
+
+    # Returns {'error_message', 'error_lines', 'error_context_complete'} within the budget
+    def fetch(self, job_name, run_id, moment):
+        deadline = time.monotonic() + self.budget_seconds
+        message_future = self.executor.submit(self._error_message, job_name, run_id)
+        lines_future = self.executor.submit(self._error_lines, run_id, moment, deadline)
+        context = {'error_message': None, 'error_lines': [], 'error_context_complete': False}
+        for future in (message_future, lines_future):
+            try:
+                result = future.result(timeout=max(0, deadline - time.monotonic()))
+            except TimeoutError:
+                metrics.add('FailureContextTimeouts')
+                print(f"Failure context of job run {run_id} of {job_name} exceeded {self.budget_seconds}s, sending without it")
+                continue
+            except Exception as e:
+                print(f"Failed to get failure context of job run {run_id} of {job_name}: {str(e)}")
+                continue
+            if future is message_future:
+                context['error_message'] = result
+            else:
+                context['error_lines'], context['error_context_complete'] = result
+        return context
+
+
+def describe_failure(message, context):
+    if context['error_message']:
+        message += f"\n\nError: {context['error_message']}"
+    if context['error_lines']:
+        message += f"\n\nLast {len(context['error_lines'])} error log lines:\n" + '\n'.join(context['error_lines'])
+    if not context['error_context_complete']:
+        message += "\n\n(Failure context incomplete, see the job run's logs in CloudWatch)"
+    return message
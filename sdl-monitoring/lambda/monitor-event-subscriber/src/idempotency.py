@@ -0,0 +1,217 @@
+import threading
+import time
+import boto3
+from botocore.exceptions import ClientError
+from collections import OrderedDict
+from metrics import metrics
+
+# Suppresses duplicate deliveries of the same EventBridge event. A delivery claims its key with a
+# conditional write of a short-lived in-progress marker, so only the first delivery across all
+# containers wins. Once the record's log row is durable the key is marked logged, and once it
+# is also notified, completed, both for the full TTL. A retry of a logged record holds the key
+# for its own invocation and only notifies again, so the log row is never written twice. A
+# marker or hold left by an invocation that timed out or crashed expires with it, and the
+# retry claims the key again. A per-container LRU answers repeats of completed keys seen by
+# this warm container.
+
+IN_PROGRESS = 'IN_PROGRESS'
+LOGGED = 'LOGGED'
+COMPLETED = 'COMPLETED'
+
+
+# Raised for a delivery whose key another invocation is still processing; failing the record
+# gets it retried after the marker has been completed or has expired, instead of dropped
+class ClaimInProgressError(Exception):
+    pass
+
+
+# Thread-safe LRU with per-entry expiry and hit/miss counters
+class LRUCache:
+
+    def __init__(self, maxsize, ttl_seconds):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def contains(self, key):
+        with self.lock:
+            expires_at = self.entries.get(key)
+            if expires_at is not None and expires_at > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True
+            if expires_at is not None:
+                del self.entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return False
+
+    def add(self, key):
+        with self.lock:
+            self.entries[key] = time.time() + self.ttl_seconds
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+# Persistent store backed by a DynamoDB table with TTL enabled on 'expires_at'
+class DynamoDBStore:
+
+    def __init__(self, table_name, client=None):
+        self.table_name = table_name
+        self.client = client or boto3.client('dynamodb')
+
+    def item(self, key, status, expires_at):
+        return {'pk': {'S': key}, 'status': {'S': status}, 'expires_at': {'N': str(int(expires_at))}}
+
+    # Writes the key unless a live item exists; returns None when written, else the status of
+    # the live item
+    def put_if_absent(self, key, status, expires_at):
+        try:
+            with metrics.timer('DynamoDBLatency'):
+                self.client.put_item(
+                    TableName=self.table_name,
+                    Item=self.item(key, status, expires_at),
+                    # DynamoDB deletes expired items lazily, so treat them as absent
+                    ConditionExpression='attribute_not_exists(pk) OR expires_at < :now',
+                    ExpressionAttributeValues={':now': {'N': str(int(time.time()))}},
+                    ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                # Keys written before the in-progress marker existed carry no status
+                return e.response.get('Item', {}).get('status', {}).get('S', COMPLETED)
+            raise
+        return None
+
+    def put(self, key, status, expires_at):
+        with metrics.timer('DynamoDBLatency'):
+            self.client.put_item(TableName=self.table_name, Item=self.item(key, status, expires_at))
+
+    # Holds a live key in the given status until held_until, unless another invocation holds it
+    def hold(self, key, status, held_until):
+        now = int(time.time())
+        try:
+            with metrics.timer('DynamoDBLatency'):
+                self.client.update_item(
+                    TableName=self.table_name,
+                    Key={'pk': {'S': key}},
+                    UpdateExpression='SET held_until = :held_until',
+                    ConditionExpression=(
+                        '#status = :status AND expires_at >= :now '
+                        'AND (attribute_not_exists(held_until) OR held_until < :now)'
+                    ),
+                    ExpressionAttributeNames={'#status': 'status'},
+                    ExpressionAttributeValues={
+                        ':status': {'S': status}, ':now': {'N': str(now)}, ':held_until': {'N': str(int(held_until))}
+                    }
+                )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def delete(self, key):
+        self.client.delete_item(TableName=self.table_name, Key={'pk': {'S': key}})
+
+
+# Local stand-in with the same conditional-write semantics, used when no table is configured
+class InMemoryStore:
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def put_if_absent(self, key, status, expires_at):
+        with self.lock:
+            current = self.items.get(key)
+            if current is not None and current[1] > time.time():
+                return current[0]
+            self.items[key] = (status, expires_at, None)
+            return None
+
+    def put(self, key, status, expires_at):
+        with self.lock:
+            self.items[key] = (status, expires_at, None)
+
+    def hold(self, key, status, held_until):
+        with self.lock:
+            current = self.items.get(key)
+            now = time.time()
+            if current is None or current[0] != status or current[1] <= now or (current[2] or 0) > now:
+                return False
+            self.items[key] = (status, current[1], held_until)
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+class IdempotencyGuard:
+
+    def __init__(self, store, maxsize=10000, ttl_seconds=86400, in_progress_seconds=300):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.in_progress_seconds = in_progress_seconds
+        self.cache = LRUCache(maxsize, ttl_seconds)
+        self.store_hits = 0
+        self.in_progress_hits = 0
+        self.logged_hits = 0
+
+    # Returns IN_PROGRESS for the first delivery of a key (log and notify), LOGGED for a retry of
+    # a record whose log row is already written (notify only) and COMPLETED for a duplicate;
+    # raises ClaimInProgressError while another invocation holds the key. The in-progress
+    # marker or hold lives for in_progress_seconds, which should cover the rest of the invocation
+    def claim(self, key, in_progress_seconds=None):
+        if self.cache.contains(key):
+            return COMPLETED
+        expires_at = time.time() + (in_progress_seconds or self.in_progress_seconds)
+        status = self.store.put_if_absent(key, IN_PROGRESS, expires_at)
+        if status is None:
+            return IN_PROGRESS
+        if status == LOGGED and self.store.hold(key, LOGGED, expires_at):
+            self.logged_hits += 1
+            return LOGGED
+        if status in (IN_PROGRESS, LOGGED):
+            self.in_progress_hits += 1
+            raise ClaimInProgressError(f"Event {key} is still being processed by another invocation")
+        self.cache.add(key)
+        self.store_hits += 1
+        return COMPLETED
+
+    # Marks a claimed key's log row as written for the full TTL; also ends a retry's hold, so
+    # the next retry of a record whose notification failed can notify again right away
+    def mark_logged(self, key):
+        self.store.put(key, LOGGED, time.time() + self.ttl_seconds)
+
+    # Marks a claimed key as handled for the full TTL, once its record is logged and notified
+    def complete(self, key):
+        self.store.put(key, COMPLETED, time.time() + self.ttl_seconds)
+        self.cache.add(key)
+
+    # Forgets a claimed key whose log row was never written, so a retry of the record is not
+    # suppressed
+    def release(self, key):
+        self.cache.discard(key)
+        self.store.delete(key)
+
+    def stats(self):
+        return {
+            'memory_hits': self.cache.hits,
+            'memory_misses': self.cache.misses,
+            'store_hits': self.store_hits,
+            'in_progress_hits': self.in_progress_hits,
+            'logged_hits': self.logged_hits,
+            'evictions': self.cache.evictions
+        }
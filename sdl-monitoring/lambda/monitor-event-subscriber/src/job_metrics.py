@@ -0,0 +1,108 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+
+# Performance metrics of finished Glue job runs, looked up with GetJobRun. A finished run
+# never changes, so results are kept in a per-container LRU: SNS/SQS redeliveries and
+# duplicate events of the same run cost no extra API calls. An invocation looks up each
+# distinct run once, a few at a time.
+
+TERMINAL_JOB_STATES = {'SUCCEEDED', 'FAILED', 'TIMEOUT', 'STOPPED', 'ERROR'}
+JOB_METRICS_CACHE_SIZE = int(os.environ.get('JOB_METRICS_CACHE_SIZE', '1024'))
+JOB_METRICS_WORKERS = int(os.environ.get('JOB_METRICS_WORKERS', '4'))
+
+# Typed columns added to every log entry; None when the metric does not apply or the lookup failed
+METRIC_COLUMNS = {
+    'job_run_id': None,
+    'execution_time_seconds': None,
+    'dpu_seconds': None,
+    'worker_type': None,
+    'number_of_workers': None,
+    'attempt': None,
+    'error_message': None
+}
+
+
+def run_metrics(job_run):
+    execution_time = job_run.get('ExecutionTime')
+    dpu_seconds = job_run.get('DPUSeconds')
+    # DPUSeconds is only reported for auto-scaling and Flex runs; estimate it from the capacity otherwise
+    if dpu_seconds is None and execution_time is not None and job_run.get('MaxCapacity') is not None:
+        dpu_seconds = execution_time * job_run['MaxCapacity']
+    return {
+        'job_run_id': job_run['Id'],
+        'execution_time_seconds': int(execution_time) if execution_time is not None else None,
+        'dpu_seconds': float(dpu_seconds) if dpu_seconds is not None else None,
+        'worker_type': job_run.get('WorkerType'),
+        'number_of_workers': job_run.get('NumberOfWorkers'),
+        'attempt': job_run.get('Attempt', 0),
+        'error_message': job_run.get('ErrorMessage')
+    }
+
+
+class JobMetrics:
+
+    def __init__(self, maxsize=JOB_METRICS_CACHE_SIZE, workers=JOB_METRICS_WORKERS, client=None):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.client = client
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def _glue(self):
+        if self.client is None:
+            self.client = boto3.client('glue', config=Config(connect_timeout=2, read_timeout=5, retries={'max_attempts': 3}))
+        return self.client
+
+    def _cached(self, key):
+        with self.lock:
+            run_values = self.entries.get(key)
+            if run_values is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            return run_values
+
+    def _lookup(self, key):
+        job_name, run_id = key
+        with metrics.timer('GlueApiLatency'):
+            job_run = self._glue().get_job_run(JobName=job_name, RunId=run_id, PredecessorsIncluded=False)['JobRun']
+        run_values = run_metrics(job_run)
+        with self.lock:
+            self.lookups += 1
+            self.entries[key] = run_values
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return run_values
+
+    # Returns {(job_name, run_id): metrics} for the runs that could be looked up
+    def get_many(self, runs):
+        results = {}
+        missing = []
+        for key in set(runs):
+            run_values = self._cached(key)
+            if run_values is not None:
+                results[key] = run_values
+            else:
+                missing.append(key)
+        if not missing:
+            return results
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(missing))) as pool:
+            futures = {key: pool.submit(self._lookup, key) for key in missing}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                # Metrics are best effort: the event is still logged without them
+                print(f"Failed to get metrics of job run {key[1]} of {key[0]}: {str(e)}")
+        return results
+
+    def stats(self):
+        with self.lock:
+            return {'cached': len(self.entries), 'hits': self.hits, 'lookups': self.lookups}
@@ -1,63 +1,178 @@
 import json
 import boto3
+import gzip
 import os
-import requests
+import uuid
+from botocore.config import Config
+from channels import EmailChannel, Router, SlackChannel, TeamsChannel
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
+from digest import (DIGEST_MODE, buffer_items, build_digest, claim_window, closed_windows, delete_keys, read_window,
+                    release_window, window_label)
+from idempotency import COMPLETED, IN_PROGRESS, LOGGED, DynamoDBStore, IdempotencyGuard, InMemoryStore
+from rules import RulesEngine, load_rules
+from metrics import metrics
+from job_metrics import METRIC_COLUMNS, TERMINAL_JOB_STATES, JobMetrics
+from failure_context import CONTEXT_STATES, FailureContext, describe_failure
+from notifier import CircuitOpenError, NotificationError, RetryBudget
+from secret_cache import SecretCache
 
-s3 = boto3.client('s3')
+MAX_WORKERS = int(os.environ.get('MAX_WORKERS', '8'))
+DEAD_LETTER_PREFIX = os.environ.get('DEAD_LETTER_PREFIX', 'dead-letter')
+NOTIFICATION_CHANNELS = os.environ.get('NOTIFICATION_CHANNELS', 'teams').split(',')
+NOTIFICATION_DEFAULT_CHANNELS = os.environ.get('NOTIFICATION_DEFAULT_CHANNELS', 'teams').split(',')
+NOTIFICATION_ROUTES = json.loads(os.environ.get('NOTIFICATION_ROUTES') or '[]')
+NOTIFICATION_RULES_FILE = os.environ.get(
+    'NOTIFICATION_RULES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'notification_rules.json')
+)
+FAILURE_STATES = ["FAILED", "Failed", "TIMEOUT", "STOPPED"]
+WEBHOOK_SECRET_ID = os.environ.get('TEAMS_WEBHOOK_SECRET_ID')
+WEBHOOK_SECRET_TTL = int(os.environ.get('TEAMS_WEBHOOK_SECRET_TTL', '300'))
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE')
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '10000'))
 
+s3 = boto3.client('s3', config=Config(max_pool_connections=MAX_WORKERS * 2))
+
+# Cached across warm invocations; falls back to TEAMS_WEBHOOK_URL when no secret is configured
+webhook_secret = SecretCache(WEBHOOK_SECRET_ID, ttl_seconds=WEBHOOK_SECRET_TTL) if WEBHOOK_SECRET_ID else None
+
+# Dedup of SNS/EventBridge redeliveries; the in-memory store stands in when no table is configured
+idempotency = IdempotencyGuard(
+    DynamoDBStore(IDEMPOTENCY_TABLE) if IDEMPOTENCY_TABLE else InMemoryStore(),
+    maxsize=IDEMPOTENCY_CACHE_SIZE,
+    ttl_seconds=IDEMPOTENCY_TTL_SECONDS
+)
+
+def webhook_url(secret_key, env_var):
+    if webhook_secret is None:
+        return os.environ[env_var]
+    return webhook_secret.get()[secret_key]
+
+def build_channels():
+    available = {
+        'teams': lambda: TeamsChannel(lambda: webhook_url('teams_webhook_url', 'TEAMS_WEBHOOK_URL')),
+        'slack': lambda: SlackChannel(lambda: webhook_url('slack_webhook_url', 'SLACK_WEBHOOK_URL')),
+        'email': lambda: EmailChannel(os.environ['EMAIL_TOPIC_ARN'])
+    }
+    return {name: available[name]() for name in NOTIFICATION_CHANNELS if name in available}
+
+def build_rules_engine():
+    rules = load_rules(NOTIFICATION_RULES_FILE) if os.path.exists(NOTIFICATION_RULES_FILE) else []
+    # Inline routes from the environment are appended as plain route rules
+    return RulesEngine(rules + NOTIFICATION_ROUTES, NOTIFICATION_DEFAULT_CHANNELS)
+
+# Finished job runs are looked up once per container
+job_metrics = JobMetrics()
+failure_context = FailureContext(job_metrics)
+
+# Channels keep their limiter and breaker state, and the rules stay compiled, across warm invocations
+router = Router(build_channels(), build_rules_engine())
+
+def event_time(message_json):
+    # EventBridge stamps every event with an ISO 8601 'time'; fall back to the processing time
+    try:
+        return datetime.strptime(message_json['time'], '%Y-%m-%dT%H:%M:%SZ')
+    except (KeyError, TypeError, ValueError):
+        return datetime.utcnow()
+
+def record_message(record):
+    # SNS invokes with the message inline; the optional SQS buffer delivers it as the body,
+    # wrapped in the SNS envelope unless raw message delivery is enabled
+    if record.get('eventSource') == 'aws:sqs':
+        body = json.loads(record['body'])
+        if body.get('Type') == 'Notification' and 'Message' in body:
+            return json.loads(body['Message'])
+        return body
+    return json.loads(record['Sns']['Message'])
+
+# Raised at the end of a non-SQS invocation with failed records, so that they are retried
+class RecordsFailedError(Exception):
+    pass
+
+def partition_path(event_datetime, entity_type):
+    return f"dt={event_datetime.strftime('%Y-%m-%d')}/hour={event_datetime.strftime('%H')}/entity_type={entity_type}"
+
+@metrics.instrument
 def lambda_handler(event, context):
-    teams_webhook_url = os.environ['TEAMS_WEBHOOK_URL']
     s3_bucket = os.environ['MONITOR_S3']
     monitor_db = os.environ['MONITOR_DATABASE']
     monitor_table = os.environ['MONITOR_TABLE']
+    retry_budget = RetryBudget(context=context)
+    # A claimed event stays in progress until this invocation could no longer be running
+    claim_seconds = context.get_remaining_time_in_millis() / 1000
+    dead_lettered = []
     
-    # Function to send a message to Microsoft Teams
-    def send_teams_message(title, message, status_emoji):
-        payload = {
-            "title": title,
-            "text": f"{status_emoji} **{title}**\n\n{message}"
-        }
+    # Function to park an undelivered notification in the monitoring bucket for a later replay
+    def spill_dead_letter(channel, payload, error):
+        now = datetime.utcnow()
+        key = f"{DEAD_LETTER_PREFIX}/{channel}/dt={now.strftime('%Y-%m-%d')}/{now.strftime('%H%M%S')}-{context.aws_request_id}-{uuid.uuid4().hex[:8]}.json"
+        with metrics.timer('S3PutLatency'):
+            s3.put_object(
+                Bucket=s3_bucket,
+                Key=key,
+                Body=json.dumps({
+                    "channel": channel,
+                    "payload": payload,
+                    "error": error,
+                    "failed_at": now.strftime('%Y-%m-%dT%H:%M:%SZ')
+                }),
+                ContentType='application/json'
+            )
+        dead_lettered.append(key)
+        metrics.add('DeadLettered')
+    
+    # Function to deliver a notification on one channel
+    def deliver(channel, notification):
+        payload = channel.format(notification)
         try:
-            response = requests.post(teams_webhook_url, json=payload)
-            if response.status_code != 200:
-                alert_message = {
-                    "text": f"Error {response.status_code}: Failed to send notification. Event details: {json.dumps(event)}"
-                }
-                requests.post(teams_webhook_url, json=alert_message)
-        except requests.exceptions.RequestException as e:
-            alert_message = {
-                "text": f"Exception: {str(e)}. Event details: {json.dumps(event)}"
-            }
-            requests.post(teams_webhook_url, json=alert_message)
-            
+            channel.send(payload, retry_budget)
+        except NotificationError as e:
+            # Park the payload instead of posting again to an overloaded endpoint
+            if not isinstance(e, CircuitOpenError):
+                print(f"Failed to send {channel.name} notification '{notification['title']}': {str(e)}")
+            spill_dead_letter(channel.name, payload, str(e))
     
-    # Check if the event contains 'Records'
-    if 'Records' not in event:
-        error_message = 'Invalid event format: Missing "Records" key'
-        send_teams_message("Error", error_message, "❌")
-        return {
-            'statusCode': 400,
-            'body': json.dumps(error_message)
-        }
+    # Function to fan a notification out to its routed channels, each on the channel's own pool
+    def dispatch(notification, channels, pools):
+        return [pools[channel.name].submit(deliver, channel, notification) for channel in channels]
     
-    # Process each SNS message
-    for record in event['Records']:
-        sns_message = record['Sns']['Message']
-        message_json = json.loads(sns_message)
-        detail = message_json['detail']
+    # Function to send a notification that is not tied to a record and wait for it
+    def notify_now(title, message, emoji, state=None):
+        notification = {"title": title, "message": message, "emoji": emoji, "state": state, "entity_type": 'unknown', "name": 'N/A'}
+        channels, suppressed_by = router.select(notification)
+        if suppressed_by:
+            return
+        with ThreadPoolExecutor(max_workers=len(channels) or 1) as pool:
+            for future in [pool.submit(deliver, channel, notification) for channel in channels]:
+                future.result()
+    
+    # Function to handle a single SNS or SQS record: dispatches the notification and returns the log entry
+    def process_record(record, pools):
+        message_json = record_message(record)
 
         if 'detail' not in message_json:
             error_message = 'Invalid message format: Missing "detail" key'
-            send_teams_message("Error", error_message, "❌")
-            continue
-        
+            notify_now("Error", error_message, "❌")
+            raise ValueError(error_message)
+
+        detail = message_json['detail']
         state = detail.get('state')
         job_name = detail.get('jobName', 'N/A')
         crawler_name = detail.get('crawlerName', 'N/A')
         timestamp = detail.get('timestamp', str(datetime.now()))
         
+        # Drop redeliveries of an event that was already handled; a redelivery of an event still
+        # in progress elsewhere raises and fails the record, so it is retried rather than dropped.
+        # A retry of a record whose log row is already written only notifies
+        idempotency_key = f"{message_json['id']}#{state}" if 'id' in message_json else None
+        claim = idempotency.claim(idempotency_key, claim_seconds) if idempotency_key else IN_PROGRESS
+        if claim == COMPLETED:
+            return None
+        
         # Create a notification message
+        entity_type = 'job' if job_name != 'N/A' else 'crawler' if crawler_name != 'N/A' else 'unknown'
         if job_name != 'N/A':
             title = f"Glue Job '{job_name}' State Change"
             notification_message = f"Glue Job '{job_name}' has reached state: {state} at {timestamp}"
@@ -68,33 +183,257 @@ def lambda_handler(event, context):
             title = "Unknown State Change Detected"
             notification_message = f"Unknown state change detected: {state} at {timestamp}"
         
+        # Failed job runs carry their error message and last error log lines, fetched within a budget;
+        # the log keeps them in their own columns
+        log_message = notification_message
+        failure = {'error_message': detail.get('errorMessage'), 'error_lines': None}
+        if entity_type == 'job' and state in CONTEXT_STATES and detail.get('jobRunId'):
+            failure = failure_context.fetch(job_name, detail['jobRunId'], event_time(message_json))
+            notification_message = describe_failure(notification_message, failure)
+        
         # Determine the status emoji based on the state
         if state in ["SUCCEEDED", "Succeeded"]:
             status_emoji = "✅"
-        elif state in ["FAILED", "Failed", "TIMEOUT", "STOPPED"]:
+        elif state in FAILURE_STATES:
             status_emoji = "❌"
         else:
             status_emoji = "ℹ️"
         
-        # Send the message to Microsoft Teams
-        send_teams_message(title, notification_message, status_emoji)
+        notification = {
+            "title": title,
+            "message": notification_message,
+            "emoji": status_emoji,
+            "state": state,
+            "entity_type": entity_type,
+            "name": job_name if entity_type == 'job' else crawler_name
+        }
         
-        # Log the message to S3
+        # Suppressed events are still logged, but neither notified nor buffered for a digest
+        channels, suppressed_by = router.select(notification)
+        notification_futures = []
+        digest_item = None
+        if suppressed_by:
+            print(f"Notification for {entity_type} '{notification['name']}' ({state}) suppressed by rule '{suppressed_by}'")
+            metrics.add('NotificationsSuppressed')
+        # Dispatch the notification; in digest mode only failures go out immediately
+        elif DIGEST_MODE and state not in FAILURE_STATES:
+            digest_item = {
+                "entity_type": entity_type,
+                "name": notification['name'],
+                "state": state,
+                "timestamp": timestamp
+            }
+        else:
+            notification_futures = dispatch(notification, channels, pools)
+        
+        # Build the log entry; it is written to S3 with the rest of the invocation's batch
         log_entry = {
             "state": state,
             "job_name": job_name,
             "crawler_name": crawler_name,
             "timestamp": timestamp,
-            "message": notification_message
+            "message": log_message,
+            **METRIC_COLUMNS,
+            "job_run_id": detail.get('jobRunId'),
+            "error_message": failure['error_message'],
+            "error_lines": failure['error_lines']
+        }
+        if claim == LOGGED:
+            log_entry = None
+        return partition_path(event_time(message_json), entity_type), log_entry, notification_futures, digest_item, idempotency_key
+    
+    # Function to add the performance metrics of finished job runs to their log entries, one lookup per run
+    def add_job_metrics(log_entries):
+        runs = [
+            (log_entry['job_name'], log_entry['job_run_id']) for _, log_entry in log_entries
+            if log_entry['job_run_id'] and log_entry['state'] in TERMINAL_JOB_STATES
+        ]
+        if not runs:
+            return
+        run_values = job_metrics.get_many(runs)
+        for _, log_entry in log_entries:
+            log_entry.update(run_values.get((log_entry['job_name'], log_entry['job_run_id']), {}))
+    
+    # Function to write the invocation's log entries as one gzip-compressed NDJSON object per partition
+    def write_log_batch(log_entries):
+        partitions = {}
+        for partition, log_entry in log_entries:
+            partitions.setdefault(partition, []).append(log_entry)
+        batch_time = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+        for partition, entries in partitions.items():
+            body = '\n'.join(json.dumps(log_entry) for log_entry in entries) + '\n'
+            with metrics.timer('S3PutLatency'):
+                s3.put_object(
+                    Bucket=s3_bucket,
+                    Key=f"{monitor_db}/{monitor_table}/{partition}/{batch_time}-{context.aws_request_id}.json.gz",
+                    Body=gzip.compress(body.encode('utf-8')),
+                    ContentType='application/gzip'
+                )
+    
+    # Function to send one summary card per closed digest window
+    def flush_digests():
+        flushed = 0
+        for window in closed_windows(s3, s3_bucket):
+            # A window that cannot be claimed, read or cleaned up is left for the next flush, and
+            # the remaining windows are still flushed
+            try:
+                # Claim before reading, so every buffer read here is either sent by this flush or
+                # left for the next one
+                if not claim_window(s3, s3_bucket, window):
+                    continue
+                try:
+                    items, keys = read_window(s3, s3_bucket, window)
+                    # A digest a channel could not take is dead-lettered like any notification, so
+                    # its buffers are deleted either way
+                    if items:
+                        notify_now(*build_digest(items, window), state='DIGEST')
+                        flushed += 1
+                    delete_keys(s3, s3_bucket, keys)
+                finally:
+                    release_window(s3, s3_bucket, window)
+            except Exception as e:
+                print(f"Failed to flush digest window {window_label(window)}: {str(e)}")
+        return flushed
+    
+    # Scheduled invocations flush the digest windows
+    if event.get('detail-type') == 'Scheduled Event':
+        flushed = flush_digests()
+        return {
+            'statusCode': 200,
+            'body': json.dumps(f"Sent {flushed} digest notifications")
+        }
+    
+    # Check if the event contains 'Records'
+    if 'Records' not in event:
+        error_message = 'Invalid event format: Missing "Records" key'
+        notify_now("Error", error_message, "❌")
+        return {
+            'statusCode': 400,
+            'body': json.dumps(error_message)
+        }
+    
+    # Process the messages concurrently; an SQS batch is handled as a unit (one S3 object per
+    # partition, one digest buffer) and only its failed messages are handed back for a retry.
+    # Every channel gets its own pool so a slow channel never delays the others, and the S3
+    # batch write below overlaps the deliveries still in flight
+    failures = []
+    log_entries = []
+    logged_indexes = []
+    # Records whose log row is durable, written now or by an earlier attempt
+    durable_indexes = set()
+    notification_futures = []
+    digest_items = []
+    claimed_keys = {}
+    duplicates = 0
+    with ExitStack() as stack:
+        record_pool = stack.enter_context(ThreadPoolExecutor(max_workers=MAX_WORKERS))
+        channel_pools = {
+            name: stack.enter_context(ThreadPoolExecutor(max_workers=MAX_WORKERS))
+            for name in router.channels
+        }
+        futures = [
+            record_pool.submit(process_record, record, channel_pools)
+            for record in event['Records']
+        ]
+        for index, future in enumerate(futures):
+            try:
+                result = future.result()
+                if result is None:
+                    duplicates += 1
+                    continue
+                partition, log_entry, record_futures, digest_item, claimed_keys[index] = result
+                if log_entry is None:
+                    durable_indexes.add(index)
+                else:
+                    log_entries.append((partition, log_entry))
+                    logged_indexes.append(index)
+                notification_futures.extend((index, future) for future in record_futures)
+                if digest_item is not None:
+                    digest_items.append((index, digest_item))
+            except Exception as e:
+                print(f"Failed to process record {index}: {str(e)}")
+                failures.append({'record': index, 'error': str(e)})
+
+        if log_entries:
+            add_job_metrics(log_entries)
+            try:
+                write_log_batch(log_entries)
+                durable_indexes.update(logged_indexes)
+            except Exception as e:
+                print(f"Failed to write log batch: {str(e)}")
+                failures.extend({'record': index, 'error': str(e)} for index in logged_indexes)
+            # Remember the written rows before waiting on the notifications, so a retry after a
+            # failed notification or a crash does not log the record again
+            for index in logged_indexes:
+                if index in durable_indexes and claimed_keys.get(index):
+                    try:
+                        idempotency.mark_logged(claimed_keys[index])
+                    except Exception as e:
+                        print(f"Failed to mark idempotency key {claimed_keys[index]} as logged: {str(e)}")
+
+        if digest_items:
+            try:
+                buffer_items(s3, s3_bucket, [item for _, item in digest_items], context.aws_request_id)
+            except Exception as e:
+                print(f"Failed to buffer digest items: {str(e)}")
+                failures.extend({'record': index, 'error': str(e)} for index, _ in digest_items)
+
+        for index, notification_future in notification_futures:
+            try:
+                notification_future.result()
+            except Exception as e:
+                print(f"Failed to notify record {index}: {str(e)}")
+                failures.append({'record': index, 'error': str(e)})
+    
+    failed_records = len({failure['record'] for failure in failures})
+    metrics.add('RecordsProcessed', len(event['Records']) - failed_records - duplicates)
+    metrics.add('RecordsFailed', failed_records)
+    metrics.add('DuplicatesSuppressed', duplicates)
+    
+    # Failed records are retried (SQS through batchItemFailures, SNS by raising below), so they
+    # must not be remembered as handled: a failed record whose log row is written stays logged
+    # and its retry only notifies, the others are released. Records that succeeded complete
+    failed_indexes = {failure['record'] for failure in failures}
+    for index, claimed_key in claimed_keys.items():
+        if not claimed_key:
+            continue
+        try:
+            if index not in failed_indexes:
+                idempotency.complete(claimed_key)
+            elif index in durable_indexes:
+                idempotency.mark_logged(claimed_key)
+            else:
+                idempotency.release(claimed_key)
+        except Exception as e:
+            # The in-progress marker expires on its own
+            print(f"Failed to update idempotency key {claimed_key}: {str(e)}")
+    if duplicates:
+        print(f"Suppressed {duplicates} duplicate deliveries, idempotency stats: {json.dumps(idempotency.stats())}")
+    
+    if any(record.get('eventSource') == 'aws:sqs' for record in event['Records']):
+        failed_indexes = sorted(failed_indexes)
+        return {
+            'statusCode': 207 if failures else 200,
+            'body': json.dumps({'processed': len(event['Records']) - len(failed_indexes), 'failures': failures}),
+            'batchItemFailures': [
+                {'itemIdentifier': event['Records'][index]['messageId']} for index in failed_indexes
+            ]
+        }
+    
+    # SNS invokes asynchronously and counts any return as delivered: raising makes Lambda retry
+    # the event, and the records that succeeded are suppressed as duplicates on the retry
+    if failures:
+        raise RecordsFailedError(f"{failed_records} of {len(event['Records'])} records could not be processed: "
+                                 f"{json.dumps(failures)}")
+    
+    if dead_lettered:
+        print(f"Dead-lettered {len(dead_lettered)} notifications under {DEAD_LETTER_PREFIX}/")
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Log saved to S3, undelivered notifications dead-lettered', 'dead_lettered': len(dead_lettered)})
         }
-        
-        s3.put_object(
-            Bucket=s3_bucket,
-            Key=f"{monitor_db}/{monitor_table}/{timestamp}-{context.aws_request_id}.json",
-            Body=json.dumps(log_entry)
-        )
     
     return {
         'statusCode': 200,
-        'body': json.dumps('Notification sent to Microsoft Teams and log saved to S3')
+        'body': json.dumps('Notifications sent and log saved to S3')
     }
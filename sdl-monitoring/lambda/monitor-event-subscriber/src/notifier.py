@@ -0,0 +1,201 @@
+import os
+import random
+import threading
+import time
+import requests
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from metrics import metrics
+
+TEAMS_CONNECT_TIMEOUT = float(os.environ.get('TEAMS_CONNECT_TIMEOUT', '3.05'))
+TEAMS_READ_TIMEOUT = float(os.environ.get('TEAMS_READ_TIMEOUT', '10'))
+TEAMS_POOL_SIZE = int(os.environ.get('TEAMS_POOL_SIZE', '10'))
+TEAMS_RATE_PER_SECOND = float(os.environ.get('TEAMS_RATE_PER_SECOND', '2'))
+TEAMS_BURST = int(os.environ.get('TEAMS_BURST', '4'))
+TEAMS_MAX_ATTEMPTS = int(os.environ.get('TEAMS_MAX_ATTEMPTS', '5'))
+TEAMS_BACKOFF_BASE = float(os.environ.get('TEAMS_BACKOFF_BASE', '0.5'))
+TEAMS_BACKOFF_CAP = float(os.environ.get('TEAMS_BACKOFF_CAP', '8'))
+TEAMS_RETRY_BUDGET_SECONDS = float(os.environ.get('TEAMS_RETRY_BUDGET_SECONDS', '30'))
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '60'))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Transport errors worth another attempt; any other requests error (an invalid URL, too many
+# redirects) fails the post right away
+RETRYABLE_EXCEPTIONS = (
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError
+)
+
+# Webhook hosts the shared session keeps a pool for: Teams and Slack, with headroom. With fewer
+# pools than hosts, alternating posts evict each other's pool and reconnect every time
+WEBHOOK_HOSTS = 4
+
+# Pooled keep-alive session, reused by warm invocations to skip the TLS handshake
+http = requests.Session()
+http.mount('https://', HTTPAdapter(pool_connections=WEBHOOK_HOSTS, pool_maxsize=TEAMS_POOL_SIZE))
+http.mount('http://', HTTPAdapter(pool_connections=WEBHOOK_HOSTS, pool_maxsize=TEAMS_POOL_SIZE))
+
+
+class NotificationError(Exception):
+    pass
+
+
+class CircuitOpenError(NotificationError):
+    pass
+
+
+# Thread-safe token bucket shared by every post from this container
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, deadline=None):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+# Caps the time an invocation may spend waiting on webhook retries
+class RetryBudget:
+    def __init__(self, seconds=TEAMS_RETRY_BUDGET_SECONDS, context=None):
+        # Never wait past the Lambda deadline, keeping a margin to flush the S3 log
+        if context is not None:
+            seconds = min(seconds, context.get_remaining_time_in_millis() / 1000 - 10)
+        self.deadline = time.monotonic() + max(seconds, 0)
+
+    def remaining(self):
+        return self.deadline - time.monotonic()
+
+    def allows(self, delay):
+        return self.remaining() > delay
+
+
+# Opens after consecutive failed deliveries so calls skip the network; once the reset
+# timeout has passed a single half-open probe decides whether to close it again
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            # Open, or half-open with the probe still in flight
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                print(f"Circuit breaker closed after {self.failures} failures")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"Circuit breaker opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+# Module-level so the limiter and breaker state carry across warm invocations
+rate_limiter = TokenBucket(TEAMS_RATE_PER_SECOND, TEAMS_BURST)
+circuit_breaker = CircuitBreaker(BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+
+
+def retry_after_seconds(response):
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff_delay(attempt):
+    # Full jitter: a random delay up to the capped exponential step
+    return random.uniform(0, min(TEAMS_BACKOFF_CAP, TEAMS_BACKOFF_BASE * 2 ** attempt))
+
+
+# Runs a delivery through a circuit breaker: raises CircuitOpenError without calling it while
+# the breaker is open and records the outcome otherwise. Any exception counts as a failure, so
+# a half-open probe always leaves the half-open state
+def call_through_breaker(breaker, func, *args):
+    if not breaker.allow_request():
+        raise CircuitOpenError("Circuit breaker is open, skipping delivery")
+    try:
+        result = func(*args)
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+# POST a JSON payload through the circuit breaker and rate limiter, retrying throttles and
+# transient errors. Raises NotificationError when the post fails permanently, runs out of
+# attempts or would exceed the retry budget.
+def post_with_retry(url, payload, budget, limiter=rate_limiter, breaker=circuit_breaker,
+                    timeout=(TEAMS_CONNECT_TIMEOUT, TEAMS_READ_TIMEOUT)):
+    return call_through_breaker(breaker, _post_with_retry, url, payload, budget, limiter, timeout)
+
+
+def _post_with_retry(url, payload, budget, limiter, timeout):
+    for attempt in range(TEAMS_MAX_ATTEMPTS):
+        if not limiter.acquire(deadline=budget.deadline):
+            raise NotificationError("Retry budget exhausted waiting for a rate limit token")
+        try:
+            with metrics.timer('WebhookLatency'):
+                response = http.post(url, json=payload, timeout=timeout)
+        except RETRYABLE_EXCEPTIONS as e:
+            error, delay = f"Exception: {str(e)}", backoff_delay(attempt)
+        except requests.exceptions.RequestException as e:
+            raise NotificationError(f"Exception: {str(e)}")
+        else:
+            if 200 <= response.status_code < 300:
+                return response
+            error = f"Error {response.status_code}: {response.text[:200]}"
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                raise NotificationError(error)
+            delay = max(retry_after_seconds(response) or 0, backoff_delay(attempt))
+
+        if attempt + 1 == TEAMS_MAX_ATTEMPTS:
+            break
+        if not budget.allows(delay):
+            raise NotificationError(f"{error} (retry budget exhausted)")
+        print(f"Webhook post failed ({error}), retrying in {delay:.2f}s")
+        metrics.add('WebhookRetries')
+        time.sleep(delay)
+
+    raise NotificationError(f"{error} (gave up after {TEAMS_MAX_ATTEMPTS} attempts)")
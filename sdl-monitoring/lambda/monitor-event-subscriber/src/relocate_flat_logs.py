@@ -0,0 +1,121 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Moves monitoring logs written before the table was partitioned into its projected layout.
+# Athena's partition projection only reads {db}/{table}/dt=/hour=/entity_type=/, so objects at
+# the table root (one JSON object per event, or one gzip NDJSON object per invocation) are
+# invisible to it until they are relocated.
+#
+# Usage:
+#   python relocate_flat_logs.py --bucket my-org-devops-dev-monitoring-bucket \
+#       --database my-org-devops-dev-monitor-db --table my-org-devops-dev-monitor-table \
+#       [--dry-run] [--endpoint-url http://localhost:5000]
+#
+# Each entry is partitioned by its logged timestamp (the object's upload time if it cannot be
+# parsed) and entity type, the way the subscriber partitions new events. A flat object is
+# deleted only once all of its partitioned copies are written, under the same name, so a
+# re-run after a failure overwrites them instead of duplicating entries.
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Relocate flat monitoring logs into the partitioned table layout')
+    parser.add_argument('--bucket', default=os.environ.get('MONITOR_S3'), help='Monitoring bucket name')
+    parser.add_argument('--database', default=os.environ.get('MONITOR_DATABASE'), help='Monitoring database')
+    parser.add_argument('--table', default=os.environ.get('MONITOR_TABLE'), help='Monitoring table')
+    parser.add_argument('--endpoint-url', help='S3 endpoint, e.g. a local S3 stand-in')
+    parser.add_argument('--workers', type=int, default=8, help='Objects relocated concurrently')
+    parser.add_argument('--dry-run', action='store_true', help='List what would be moved without writing')
+    args = parser.parse_args(argv)
+    if not args.bucket or not args.database or not args.table:
+        parser.error('--bucket, --database and --table are required (or set MONITOR_S3 / MONITOR_DATABASE / MONITOR_TABLE)')
+    return args
+
+
+# Yields pages of the log objects directly at the table root; partitioned objects sit below it
+def flat_pages(s3, bucket, prefix):
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+        yield [obj for obj in page.get('Contents', []) if obj['Key'].endswith(('.json', '.json.gz'))]
+
+
+def read_entries(body, key):
+    if key.endswith('.gz'):
+        body = gzip.decompress(body)
+    return [json.loads(line) for line in body.decode('utf-8').splitlines() if line.strip()]
+
+
+# The subscriber logged EventBridge's ISO 8601 timestamps, or Python's str(datetime) as a fallback
+def entry_time(entry, uploaded_at):
+    try:
+        moment = datetime.fromisoformat(entry['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        moment = uploaded_at
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def partition_path(entry, uploaded_at):
+    moment = entry_time(entry, uploaded_at)
+    job_name, crawler_name = entry.get('job_name', 'N/A'), entry.get('crawler_name', 'N/A')
+    entity_type = 'job' if job_name != 'N/A' else 'crawler' if crawler_name != 'N/A' else 'unknown'
+    return f"dt={moment.strftime('%Y-%m-%d')}/hour={moment.strftime('%H')}/entity_type={entity_type}"
+
+
+def relocate(args):
+    s3 = boto3.client('s3', endpoint_url=args.endpoint_url, config=Config(max_pool_connections=args.workers))
+    prefix = f"{args.database}/{args.table}/"
+    stats = {'moved': 0, 'entries': 0, 'failed': 0}
+
+    def relocate_one(obj):
+        key = obj['Key']
+        try:
+            entries = read_entries(s3.get_object(Bucket=args.bucket, Key=key)['Body'].read(), key)
+        except (ValueError, OSError, EOFError) as e:
+            print(f"Failed to read {key}: {str(e)}")
+            return 'failed', 0
+        partitions = {}
+        for entry in entries:
+            partitions.setdefault(partition_path(entry, obj['LastModified']), []).append(entry)
+        name = key[len(prefix):].rsplit('.json', 1)[0]
+        for partition, partition_entries in partitions.items():
+            target = f"{prefix}{partition}/{name}.json.gz"
+            if args.dry_run:
+                print(f"Would move {len(partition_entries)} entries of {key} to {target}")
+                continue
+            body = '\n'.join(json.dumps(entry) for entry in partition_entries) + '\n'
+            s3.put_object(Bucket=args.bucket, Key=target, Body=gzip.compress(body.encode('utf-8')),
+                          ContentType='application/gzip')
+        if not args.dry_run:
+            s3.delete_object(Bucket=args.bucket, Key=key)
+        return 'moved', len(entries)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for objects in flat_pages(s3, args.bucket, prefix):
+            for outcome, count in pool.map(relocate_one, objects):
+                stats[outcome] += 1
+                stats['entries'] += count
+    elapsed = time.monotonic() - started
+
+    print(f"{'Would move' if args.dry_run else 'Moved'} {stats['moved']} objects ({stats['entries']} entries), "
+          f"failed {stats['failed']} in {elapsed:.1f}s")
+    return stats
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stats = relocate(args)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import sys
+import time
+import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+
+# Run from the repository, the helpers shared by all Lambdas live in sdl-common
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 4, 'sdl-common', 'lambda', 'src'))
+
+from notifier import CircuitOpenError, NotificationError, RetryBudget, post_with_retry
+
+DELIVERED_SUFFIX = '.delivered'
+
+# Replays notifications the subscriber dead-lettered while a webhook channel (Teams or Slack)
+# was down.
+#
+# Usage:
+#   python replay_dead_letters.py --bucket my-org-devops-dev-monitoring-bucket \
+#       --webhook-url https://... [--since 2024-07-01] [--endpoint-url http://localhost:5000]
+#
+# Objects are streamed page by page, fetched concurrently and re-sent through the same
+# rate limiter and circuit breaker as the Lambda. Every delivered object gets a
+# '<key>.delivered' marker so a re-run skips it.
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Replay dead-lettered webhook notifications')
+    parser.add_argument('--bucket', default=os.environ.get('MONITOR_S3'), help='Monitoring bucket name')
+    parser.add_argument('--prefix', default=f"{os.environ.get('DEAD_LETTER_PREFIX', 'dead-letter')}/teams",
+                        help='Dead-letter prefix of the channel to replay, e.g. dead-letter/slack')
+    parser.add_argument('--webhook-url', default=os.environ.get('TEAMS_WEBHOOK_URL'), help='Webhook URL of that channel')
+    parser.add_argument('--since', help='Only replay partitions from this date (YYYY-MM-DD) on')
+    parser.add_argument('--endpoint-url', help='S3 endpoint, e.g. a local S3 stand-in')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent S3 GETs and webhook posts')
+    parser.add_argument('--budget-seconds', type=float, default=900, help='Total time allowed for retries')
+    parser.add_argument('--dry-run', action='store_true', help='List what would be replayed without sending')
+    args = parser.parse_args(argv)
+    if not args.bucket or (not args.webhook_url and not args.dry_run):
+        parser.error('--bucket and --webhook-url are required (or set MONITOR_S3 / TEAMS_WEBHOOK_URL)')
+    return args
+
+
+# Yields pages of dead-letter keys that have no delivery marker yet
+def pending_pages(s3, bucket, prefix, since=None):
+    paginator = s3.get_paginator('list_objects_v2')
+    start_after = f"{prefix}/dt={since}" if since else ''
+    carried = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/", StartAfter=start_after):
+        keys = carried + [obj['Key'] for obj in page.get('Contents', [])]
+        # A marker sorts right after its object, so an object ending a truncated page waits
+        # for the next page to learn whether it was delivered
+        carried = keys[-1:] if page.get('IsTruncated') and not keys[-1].endswith(DELIVERED_SUFFIX) else []
+        keys = keys[:-1] if carried else keys
+        delivered = {key[:-len(DELIVERED_SUFFIX)] for key in keys if key.endswith(DELIVERED_SUFFIX)}
+        skipped = len(delivered)
+        pending = [key for key in keys if not key.endswith(DELIVERED_SUFFIX) and key not in delivered]
+        yield pending, skipped
+    if carried:
+        yield carried, 0
+
+
+def replay(args):
+    s3 = boto3.client('s3', endpoint_url=args.endpoint_url, config=Config(max_pool_connections=args.workers))
+    budget = RetryBudget(seconds=args.budget_seconds)
+    stats = {'delivered': 0, 'skipped': 0, 'failed': 0}
+    stop = []
+
+    def replay_one(key):
+        if stop:
+            return 'failed'
+        dead_letter = json.loads(s3.get_object(Bucket=args.bucket, Key=key)['Body'].read())
+        if args.dry_run:
+            print(f"Would replay {key}: {dead_letter['payload'].get('title')}")
+            return 'delivered'
+        try:
+            post_with_retry(args.webhook_url, dead_letter['payload'], budget)
+        except CircuitOpenError as e:
+            stop.append(str(e))
+            return 'failed'
+        except NotificationError as e:
+            print(f"Failed to replay {key}: {str(e)}")
+            return 'failed'
+        s3.put_object(Bucket=args.bucket, Key=key + DELIVERED_SUFFIX, Body=b'')
+        return 'delivered'
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for pending, skipped in pending_pages(s3, args.bucket, args.prefix, args.since):
+            stats['skipped'] += skipped
+            for outcome in pool.map(replay_one, pending):
+                stats[outcome] += 1
+            if stop:
+                print(f"Stopping replay: {stop[0]}")
+                break
+    elapsed = time.monotonic() - started
+
+    rate = stats['delivered'] / elapsed if elapsed > 0 else 0.0
+    print(f"Delivered {stats['delivered']}, skipped {stats['skipped']} already delivered, "
+          f"failed {stats['failed']} in {elapsed:.1f}s ({rate:.1f} notifications/s)")
+    return stats
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stats = replay(args)
+    return 1 if stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
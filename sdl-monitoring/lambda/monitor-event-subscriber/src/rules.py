@@ -0,0 +1,153 @@
+import fnmatch
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+# Declarative notification rules, compiled once per container.
+#
+#   {"rules": [
+#     {"name": "hourly-successes", "action": "suppress", "jobs": ["hourly-*"], "states": ["SUCCEEDED"]},
+#     {"name": "night-quiet", "action": "suppress", "states": ["SUCCEEDED", "Succeeded"],
+#      "time_windows": [{"days": ["Sat", "Sun"]}, {"start": "22:00", "end": "06:00"}]},
+#     {"name": "billing-failures", "jobs": ["billing-*"], "states": ["FAILED", "TIMEOUT"],
+#      "channels": ["slack", "email"], "min_interval_seconds": 900}
+#   ]}
+#
+# 'jobs' / 'crawlers' are name globs, 'states' exact states and 'time_windows' UTC day/time
+# ranges (a window may wrap midnight); a rule without a filter matches everything on that
+# dimension. The first matching 'suppress' rule drops the notification. Otherwise the
+# notification goes to the union of the 'channels' of the matching 'route' rules, or to the
+# default channels when none match. 'min_interval_seconds' suppresses repeats of the same
+# job/crawler and state through that rule within the interval; a route rule without
+# 'channels' uses the default channels.
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+ANY = '*'
+
+
+def load_rules(path):
+    with open(path) as rules_file:
+        return json.load(rules_file).get('rules', [])
+
+
+def _minutes(value):
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class CompiledRule:
+
+    def __init__(self, position, rule):
+        self.position = position
+        self.name = rule.get('name', f"rule-{position}")
+        self.action = rule.get('action', 'route')
+        if self.action not in ('route', 'suppress'):
+            raise ValueError(f"Rule {self.name}: unknown action {self.action}")
+        self.channels = rule.get('channels', [])
+        self.min_interval_seconds = float(rule.get('min_interval_seconds', 0))
+        self.states = rule.get('states')
+        self.patterns = {'job': rule.get('jobs'), 'crawler': rule.get('crawlers')}
+        self.has_name_filter = 'jobs' in rule or 'crawlers' in rule
+        self.windows = [
+            (
+                {DAYS.index(day) for day in window.get('days', DAYS)},
+                _minutes(window.get('start', '00:00')),
+                _minutes(window.get('end', '24:00'))
+            )
+            for window in rule.get('time_windows', [])
+        ]
+
+    def in_window(self, now):
+        if not self.windows:
+            return True
+        minute = now.hour * 60 + now.minute
+        for days, start, end in self.windows:
+            if start <= end and now.weekday() in days and start <= minute < end:
+                return True
+            # Windows that wrap midnight belong to the day they start on
+            if start > end and ((now.weekday() in days and minute >= start)
+                                or ((now.weekday() - 1) % 7 in days and minute < end)):
+                return True
+        return False
+
+
+class RulesEngine:
+
+    def __init__(self, rules, default_channels):
+        self.rules = [CompiledRule(position, rule) for position, rule in enumerate(rules)]
+        self.default_channels = list(default_channels)
+        self.last_fired = {}
+        self.lock = threading.Lock()
+        self.suppressed = 0
+
+        # Index: (entity_type, state) -> exact names and one combined regex per glob set,
+        # with '*' buckets for rules that do not filter on that dimension
+        self.index = {}
+        for rule in self.rules:
+            entity_types = [ANY] if not rule.has_name_filter else [
+                entity_type for entity_type, patterns in rule.patterns.items() if patterns is not None
+            ]
+            for entity_type in entity_types:
+                for state in rule.states or [ANY]:
+                    bucket = self.index.setdefault((entity_type, state), {'exact': {}, 'globs': []})
+                    patterns = [ANY] if entity_type == ANY else rule.patterns[entity_type]
+                    for pattern in patterns:
+                        if any(char in pattern for char in '*?['):
+                            bucket['globs'].append((re.compile(fnmatch.translate(pattern)), rule))
+                        else:
+                            bucket['exact'].setdefault(pattern, []).append(rule)
+        self._candidates = lru_cache(maxsize=4096)(self._match)
+
+    def _match(self, entity_type, name, state):
+        matched = {}
+        for key in ((entity_type, state), (entity_type, ANY), (ANY, state), (ANY, ANY)):
+            bucket = self.index.get(key)
+            if bucket is None:
+                continue
+            for rule in bucket['exact'].get(name, []):
+                matched[rule.position] = rule
+            for regex, rule in bucket['globs']:
+                if regex.match(name):
+                    matched[rule.position] = rule
+        return tuple(rule for _, rule in sorted(matched.items()))
+
+    # Returns (channel names, name of the suppressing rule or None)
+    def evaluate(self, notification, now=None):
+        now = now or datetime.utcnow()
+        candidates = [
+            rule for rule in self._candidates(notification['entity_type'], notification['name'], notification['state'])
+            if rule.in_window(now)
+        ]
+        for rule in candidates:
+            if rule.action == 'suppress':
+                return self._suppress(rule)
+        routes = [rule for rule in candidates if rule.action == 'route']
+        for rule in routes:
+            if rule.min_interval_seconds and not self._first_in_interval(rule, notification):
+                return self._suppress(rule)
+        if not routes:
+            return self.default_channels, None
+        channels = []
+        for rule in routes:
+            for channel in rule.channels or self.default_channels:
+                if channel not in channels:
+                    channels.append(channel)
+        return channels, None
+
+    def _first_in_interval(self, rule, notification):
+        key = (rule.position, notification['entity_type'], notification['name'], notification['state'])
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_fired.get(key)
+            if last is not None and now - last < rule.min_interval_seconds:
+                return False
+            self.last_fired[key] = now
+            return True
+
+    def _suppress(self, rule):
+        with self.lock:
+            self.suppressed += 1
+        return [], rule.name
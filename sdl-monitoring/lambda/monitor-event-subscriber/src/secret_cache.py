@@ -0,0 +1,74 @@
+import json
+import threading
+import time
+import boto3
+
+# In-process cache for a Secrets Manager secret. Warm invocations read the cached value;
+# once it is older than ttl - refresh_ahead a background thread fetches a fresh copy while
+# callers keep using the current one, so rotation is picked up within the TTL without any
+# invocation waiting on GetSecretValue. Only a cold or fully expired cache fetches inline, and
+# then a single caller fetches while concurrent callers wait for its value.
+
+
+class SecretCache:
+
+    def __init__(self, secret_id, ttl_seconds=300, refresh_ahead_seconds=60, client=None):
+        self.secret_id = secret_id
+        self.ttl_seconds = ttl_seconds
+        self.refresh_ahead_seconds = min(refresh_ahead_seconds, ttl_seconds)
+        self.client = client
+        self.value = None
+        self.fetched_at = 0.0
+        self.refreshing = False
+        self.lock = threading.Lock()
+        # Held for the duration of a GetSecretValue call, inline or in the background
+        self.fetch_lock = threading.Lock()
+
+    def _fetch(self):
+        if self.client is None:
+            self.client = boto3.client('secretsmanager')
+        secret = json.loads(self.client.get_secret_value(SecretId=self.secret_id)['SecretString'])
+        with self.lock:
+            self.value = secret
+            self.fetched_at = time.monotonic()
+        return secret
+
+    def _fresh_value(self):
+        with self.lock:
+            if self.value is not None and time.monotonic() - self.fetched_at < self.ttl_seconds:
+                return self.value
+        return None
+
+    def _fetch_inline(self):
+        with self.fetch_lock:
+            # Another caller may have fetched the secret while this one waited for the lock
+            value = self._fresh_value()
+            return value if value is not None else self._fetch()
+
+    def _refresh_in_background(self):
+        try:
+            with self.fetch_lock:
+                self._fetch()
+        except Exception as e:
+            # Keep serving the cached value; the next call past the TTL fetches inline
+            print(f"Background refresh of secret {self.secret_id} failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def get(self):
+        with self.lock:
+            value, age = self.value, time.monotonic() - self.fetched_at
+            start_refresh = (
+                value is not None
+                and age >= self.ttl_seconds - self.refresh_ahead_seconds
+                and age < self.ttl_seconds
+                and not self.refreshing
+            )
+            if start_refresh:
+                self.refreshing = True
+        if value is None or age >= self.ttl_seconds:
+            return self._fetch_inline()
+        if start_refresh:
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+        return value
@@ -0,0 +1,93 @@
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src')
+sys.path[:0] = [SRC, os.path.join(SRC, *[os.pardir] * 4, 'sdl-common', 'lambda', 'src')]
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('METRICS_ENABLED', 'false')
+
+import idempotency
+from idempotency import COMPLETED, IN_PROGRESS, LOGGED, ClaimInProgressError, IdempotencyGuard, InMemoryStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1700000000.0
+
+    def time(self):
+        return self.now
+
+
+class IdempotencyGuardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(idempotency, 'time', types.SimpleNamespace(time=self.clock.time))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = InMemoryStore()
+        self.guard = IdempotencyGuard(self.store, maxsize=3, ttl_seconds=3600, in_progress_seconds=60)
+
+    def test_duplicate_of_an_in_progress_claim_is_retried_later(self):
+        self.assertEqual(self.guard.claim('evt-1#FAILED'), IN_PROGRESS)
+        with self.assertRaises(ClaimInProgressError):
+            self.guard.claim('evt-1#FAILED')
+        self.assertEqual(self.guard.stats()['in_progress_hits'], 1)
+
+    def test_in_progress_claim_expires_after_a_crash(self):
+        self.guard.claim('evt-1#FAILED', in_progress_seconds=30)
+        self.clock.now += 31
+        self.assertEqual(self.guard.claim('evt-1#FAILED'), IN_PROGRESS)
+
+    def test_released_key_is_claimed_again(self):
+        self.guard.claim('evt-1#FAILED')
+        self.guard.release('evt-1#FAILED')
+        self.assertEqual(self.guard.claim('evt-1#FAILED'), IN_PROGRESS)
+
+    def test_completed_key_is_suppressed(self):
+        self.guard.claim('evt-1#FAILED')
+        self.guard.complete('evt-1#FAILED')
+        self.assertEqual(self.guard.claim('evt-1#FAILED'), COMPLETED)
+        self.assertEqual(self.guard.stats()['memory_hits'], 1)
+
+    def test_completed_key_is_suppressed_by_the_store_in_another_container(self):
+        self.guard.claim('evt-1#FAILED')
+        self.guard.complete('evt-1#FAILED')
+        other = IdempotencyGuard(self.store, ttl_seconds=3600)
+        self.assertEqual(other.claim('evt-1#FAILED'), COMPLETED)
+        self.assertEqual(other.stats()['store_hits'], 1)
+
+    def test_completed_key_expires_with_the_ttl(self):
+        self.guard.claim('evt-1#FAILED')
+        self.guard.complete('evt-1#FAILED')
+        self.clock.now += 3601
+        self.assertEqual(self.guard.claim('evt-1#FAILED'), IN_PROGRESS)
+
+    def test_logged_key_is_held_by_one_retry(self):
+        self.guard.claim('evt-1#FAILED')
+        self.guard.mark_logged('evt-1#FAILED')
+        self.assertEqual(self.guard.claim('evt-1#FAILED'), LOGGED)
+        with self.assertRaises(ClaimInProgressError):
+            self.guard.claim('evt-1#FAILED')
+        # A failed retry ends its hold, so the next retry notifies right away
+        self.guard.mark_logged('evt-1#FAILED')
+        self.assertEqual(self.guard.claim('evt-1#FAILED'), LOGGED)
+        self.guard.complete('evt-1#FAILED')
+        self.assertEqual(self.guard.claim('evt-1#FAILED'), COMPLETED)
+
+    def test_least_recently_used_keys_are_evicted(self):
+        for index in range(4):
+            self.guard.claim(f"evt-{index}#FAILED")
+            self.guard.complete(f"evt-{index}#FAILED")
+        self.assertEqual(self.guard.stats()['evictions'], 1)
+        self.assertNotIn('evt-0#FAILED', self.guard.cache.entries)
+        # The evicted key is still suppressed by the store
+        self.assertEqual(self.guard.claim('evt-0#FAILED'), COMPLETED)
+        self.assertEqual(self.guard.stats()['store_hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
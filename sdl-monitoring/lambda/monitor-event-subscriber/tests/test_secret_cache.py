@@ -0,0 +1,102 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+import secret_cache
+from secret_cache import SecretCache
+
+
+class CountingClient:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.url = 'https://example.webhook.office.com/a'
+        self.lock = threading.Lock()
+
+    def get_secret_value(self, SecretId):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {'SecretString': json.dumps({'teams_webhook_url': self.url})}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def wait_for_refresh(cache):
+    deadline = time.monotonic() + 5
+    while cache.refreshing and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class SecretCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(secret_cache, 'time', types.SimpleNamespace(monotonic=self.clock.monotonic))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_warm_invocations_share_the_cached_secret(self):
+        client = CountingClient()
+        cache = SecretCache('monitor-secret', ttl_seconds=300, refresh_ahead_seconds=60, client=client)
+        seen = []
+        # One invocation per second, with the secret rotated halfway through
+        for invocation in range(1000):
+            if invocation == 500:
+                client.url = 'https://example.webhook.office.com/rotated'
+            seen.append(cache.get()['teams_webhook_url'])
+            wait_for_refresh(cache)
+            self.clock.now += 1
+
+        # One cold fetch, then one background refresh per ttl - refresh_ahead seconds
+        self.assertLessEqual(client.calls, 1 + math.ceil(1000 / 240))
+        self.assertEqual(seen[-1], client.url)
+        self.assertLessEqual(seen.index(client.url), 500 + 300)
+
+    def test_cold_cache_is_fetched_once_by_concurrent_callers(self):
+        client = CountingClient(delay=0.05)
+        cache = SecretCache('monitor-secret', client=client)
+        start = threading.Barrier(8)
+        values = []
+
+        def call():
+            start.wait()
+            values.append(cache.get())
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(len(values), 8)
+        self.assertTrue(all(value == values[0] for value in values))
+
+    def test_expired_cache_is_fetched_inline(self):
+        client = CountingClient()
+        cache = SecretCache('monitor-secret', ttl_seconds=300, refresh_ahead_seconds=0, client=client)
+        cache.get()
+        self.clock.now += 300
+        client.url = 'https://example.webhook.office.com/rotated'
+
+        self.assertEqual(cache.get()['teams_webhook_url'], client.url)
+        self.assertEqual(client.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()